@@ -1,7 +1,71 @@
-import os  # pragma: no cover
+import atexit
+import os
+import shutil
+import sys
 
-from django.core.asgi import get_asgi_application  # pragma: no cover
+#: ASGI applications created by :py:func:`get_application`, by arguments
+_applications = {}
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "helper")  # pragma: no cover
 
-application = get_asgi_application()
+def get_application(application, helper_path=None, cms=False, extra_args=None):
+    """
+    Return the ASGI application of the project configured by the helper file.
+
+    Settings are built by the same pipeline used by ``test`` and ``server`` commands (as in ``server`` command) and
+    the database is set up, thus the returned application can be served by any ASGI server or called in process.
+    Settings are built once: further calls with the same arguments return the same application.
+
+    Usage (e.g.: in a ``asgi.py`` file served by ``uvicorn asgi:application``)::
+
+        from app_helper.asgi import get_application
+
+        application = get_application("my_app", "helper.py", cms=True)
+
+    :param application: application module name
+    :param helper_path: path of the helper file (default: ``helper.py`` in the current directory)
+    :param cms: enable django CMS settings
+    :param extra_args: list of additional ``server`` command options (e.g.: ``["--no-migrate"]``)
+    :return: ASGI application
+    """
+    from django.conf import settings
+    from django.core.asgi import get_asgi_application
+    from docopt import docopt
+
+    from .main import __doc__ as usage
+    from .server import _setup_db
+    from .utils import _make_settings, make_temp_dir
+
+    key = (application, os.path.abspath(helper_path) if helper_path else None, cms, tuple(extra_args or ()))
+    if key in _applications:
+        return _applications[key]
+    argv = [application, "server"]
+    if helper_path:
+        argv.append("--extra-settings={}".format(helper_path))
+        # application is expected to be importable from the helper file directory, as from the command line
+        helper_dir = os.path.dirname(os.path.abspath(helper_path))
+        if helper_dir not in sys.path:
+            sys.path.insert(0, helper_dir)
+    if cms:
+        argv.append("--cms")
+    argv.extend(extra_args or [])
+    args = docopt(usage, argv=argv)
+
+    static_root = make_temp_dir("static")
+    media_root = make_temp_dir("media")
+    for directory in (static_root, media_root):
+        atexit.register(shutil.rmtree, directory, True)
+    _make_settings(args, application, settings, static_root, media_root)
+    _setup_db(args.get("--migrate", True))
+    _applications[key] = get_asgi_application()
+    return _applications[key]
+
+
+def __getattr__(name):  # pragma: no cover
+    """Create the default ``application``, configured by the ``helper`` settings module, on first access."""
+    if name != "application":
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    from django.core.asgi import get_asgi_application
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "helper")
+    globals()["application"] = get_asgi_application()
+    return globals()["application"]
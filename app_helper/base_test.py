@@ -1,4 +1,6 @@
 import os.path
+import shutil
+import time
 import warnings
 from collections import OrderedDict
 from contextlib import contextmanager
@@ -9,11 +11,40 @@ from unittest.mock import patch
 
 from django.conf import settings
 from django.core.handlers.base import BaseHandler
+from django.dispatch import receiver
 from django.http import HttpResponse, SimpleCookie
 from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.signals import setting_changed
 from django.utils.functional import SimpleLazyObject
 
-from .utils import UserLoginContext, create_user, get_user_model, reload_urls, temp_dir
+from .utils import UserLoginContext, bulk_create_users, create_user, get_user_model, reload_urls, temp_dir
+
+#: Primary keys of the shared users, by database and users data
+_shared_users_pks = {}
+
+#: Pages snapshots, by database and pages data fingerprint, see :py:meth:`CMSPageRenderingMixin._get_pages_snapshot`
+_pages_snapshots = {}
+
+#: Encoded images content, by color mode, size and format, see :py:meth:`CreateTestDataMixin._get_image_content`
+_images_content = {}
+
+#: Temporary directories of the images files written by :py:meth:`CreateTestDataMixin.create_django_image`
+_images_dirs = []
+
+#: Images files opened by :py:meth:`CreateTestDataMixin.create_django_image`
+_images_files = []
+
+#: Session engines modules, by ``SESSION_ENGINE`` setting value
+_session_engines = {}
+
+#: Middleware instances used by :py:meth:`RequestTestCaseMixin._apply_middlewares`, by ``MIDDLEWARE`` setting value
+_middleware_chain = {}
+
+
+@receiver(setting_changed)
+def _reset_middleware_chain(setting, **kwargs):
+    # middlewares read any setting when instantiated (e.g.: SessionMiddleware binds SESSION_ENGINE)
+    _middleware_chain.clear()
 
 
 class RequestTestCaseMixin:
@@ -25,13 +56,38 @@ class RequestTestCaseMixin:
     """
 
     _login_context = None
+    _request_factory = None
 
-    def _prepare_request(self, request, page, user, lang, use_middlewares, use_toolbar=False, secure=False):
+    #: Number of times the middleware chain has been built by :py:meth:`_get_middlewares`
+    middleware_chain_builds = 0
+
+    def _post_teardown(self):
+        """Clear the in-process sessions (see :py:mod:`app_helper.sessions`) after each test."""
+        from .sessions import clear_sessions
+
+        super()._post_teardown()
+        clear_sessions()
+
+    @classmethod
+    def _get_request_factory(cls):
+        """Return the :py:class:`django.test.RequestFactory` instance shared by the test class."""
+        if cls.__dict__.get("_request_factory") is None:
+            cls._request_factory = RequestFactory()
+        return cls._request_factory
+
+    @staticmethod
+    def _get_session_engine():
+        """Return the ``settings.SESSION_ENGINE`` module."""
         from importlib import import_module
 
+        if settings.SESSION_ENGINE not in _session_engines:
+            _session_engines[settings.SESSION_ENGINE] = import_module(settings.SESSION_ENGINE)
+        return _session_engines[settings.SESSION_ENGINE]
+
+    def _prepare_request(self, request, page, user, lang, use_middlewares, use_toolbar=False, secure=False):
         from django.contrib.auth.models import AnonymousUser
 
-        engine = import_module(settings.SESSION_ENGINE)
+        engine = self._get_session_engine()
 
         request.current_page = SimpleLazyObject(lambda: page)
         if not user:
@@ -69,34 +125,56 @@ class RequestTestCaseMixin:
                 mid.__call__(request)
         return request
 
-    def _apply_middlewares(self, request):
-        handler = BaseHandler()
+    @classmethod
+    def _get_middlewares(cls):
+        """
+        Return the instances of the middlewares in ``settings.MIDDLEWARE``, in reverse order.
+
+        Instances are created once and reused until any setting changes.
+        """
         from django.utils.module_loading import import_string
 
-        for middleware_path in reversed(settings.MIDDLEWARE):
-            middleware = import_string(middleware_path)
+        key = tuple(settings.MIDDLEWARE)
+        if key not in _middleware_chain:
+            _middleware_chain.clear()
+            handler = BaseHandler()
+            instances = []
+            for middleware_path in reversed(key):
+                middleware = import_string(middleware_path)
+
+                if hasattr(middleware, "process_request"):
+                    instances.append(middleware(handler))
+                else:
+                    instances.append(middleware(lambda req: HttpResponse()))
+            _middleware_chain[key] = instances
+            RequestTestCaseMixin.middleware_chain_builds += 1
+        return _middleware_chain[key]
 
-            if hasattr(middleware, "process_request"):
-                mw_instance = middleware(handler)
+    def _apply_middlewares(self, request):
+        for mw_instance in self._get_middlewares():
+            if hasattr(mw_instance, "process_request"):
                 mw_instance.process_request(request)
             else:
-                mw_instance = middleware(lambda req: HttpResponse())
                 mw_instance.__call__(request)
 
-    def login_user_context(self, user, password=None):
+    def login_user_context(self, user, password=None, authenticate=None):
         """
         Context manager to make logged in requests.
 
+        User is logged in by :py:meth:`django.test.Client.force_login`, skipping the authentication backends, unless
+        ``password`` is provided or ``authenticate`` is set.
+
         Usage::
 
-            with self.login_user_context("<username>", password="<password>"):
+            with self.login_user_context(user, password="<password>"):
                 request = self.request("/", lang="en")
-                ... # this request has <username> as user
+                ... # this request is authenticated as user
 
-        :param user: user username
+        :param user: user
         :param password: user password (if omitted, username is used)
+        :param authenticate: log the user in with :py:meth:`django.test.Client.login`, checking its password
         """
-        return UserLoginContext(self, user, password)
+        return UserLoginContext(self, user, password, authenticate)
 
     def request(
         self,
@@ -141,7 +219,7 @@ class RequestTestCaseMixin:
         :type secure: bool
         :return: request
         """
-        request = getattr(RequestFactory(), method)(path, data=data, secure=secure)
+        request = getattr(self._get_request_factory(), method)(path, data=data, secure=secure)
         return self._prepare_request(
             request,
             page,
@@ -152,6 +230,41 @@ class RequestTestCaseMixin:
             use_toolbar=use_toolbar,
         )
 
+    def requests(
+        self,
+        paths,
+        method="get",
+        data=None,
+        page=None,
+        lang="",
+        user=None,
+        use_middlewares=False,
+        secure=False,
+        use_toolbar=False,
+    ):
+        """
+        Create a request for each of the given paths, with the same parameters.
+
+        See :py:meth:`request` for the parameters description.
+
+        :param paths: requests paths
+        :type paths: iterable of str
+        :return: list of requests
+        """
+        factory_method = getattr(self._get_request_factory(), method)
+        return [
+            self._prepare_request(
+                factory_method(path, data=data, secure=secure),
+                page,
+                user,
+                lang,
+                use_middlewares,
+                secure=secure,
+                use_toolbar=use_toolbar,
+            )
+            for path in paths
+        ]
+
 
 class CreateTestDataMixin:
     """Provide methods to automatically create users on test setup and shortcut to generate test data."""
@@ -183,6 +296,10 @@ class CreateTestDataMixin:
     #: Email for auto-generated non-staff user
     _user_user_email = "user@admin.com"
 
+    #: Create the standard users once per database and share them across test classes
+    #: (see :py:meth:`_setup_shared_users`)
+    _shared_users = False
+
     @classmethod
     def _setup_users(cls):
         """
@@ -191,7 +308,11 @@ class CreateTestDataMixin:
         * :py:attr:`user`: superuser
         * :py:attr:`user_staff`: staff user
         * :py:attr:`user_normal`: plain django user
+
+        If :py:attr:`_shared_users` is set, users are shared across test classes, see :py:meth:`_setup_shared_users`.
         """
+        if cls._shared_users:
+            return cls._setup_shared_users()
         cls.user = create_user(
             cls._admin_user_username,
             cls._admin_user_email,
@@ -214,16 +335,76 @@ class CreateTestDataMixin:
             is_superuser=False,
         )
 
+    @classmethod
+    def _setup_shared_users(cls):
+        """
+        Create standard users once per database.
+
+        Users are created with a single query the first time, and fetched by their primary key by the following
+        test classes using the same users data; they are created again if any of them has been deleted (e.g.: by
+        :py:meth:`_teardown_users` of a test class which does not share users, or by a
+        :py:class:`~django.test.TransactionTestCase` database flush).
+
+        Tests must not alter the shared users, as changes are visible to the following test classes.
+        """
+        from django.db import connection
+
+        users_data = (
+            {
+                "username": cls._admin_user_username,
+                "email": cls._admin_user_email,
+                "password": cls._admin_user_password,
+                "is_staff": True,
+                "is_superuser": True,
+            },
+            {
+                "username": cls._staff_user_username,
+                "email": cls._staff_user_email,
+                "password": cls._staff_user_password,
+                "is_staff": True,
+            },
+            {
+                "username": cls._user_user_username,
+                "email": cls._user_user_email,
+                "password": cls._user_user_password,
+            },
+        )
+        key = (
+            connection.alias,
+            connection.settings_dict["NAME"],
+            tuple(tuple(sorted(data.items())) for data in users_data),
+        )
+        User = get_user_model()  # NOQA
+        users = []
+        if key in _shared_users_pks:
+            found = User.objects.in_bulk(_shared_users_pks[key])
+            users = [found[pk] for pk in _shared_users_pks[key] if pk in found]
+        if len(users) != len(users_data):
+            users = bulk_create_users(users_data)
+            _shared_users_pks[key] = [user.pk for user in users]
+        cls.user, cls.user_staff, cls.user_normal = users
+
     @classmethod
     def _teardown_users(cls):
-        """Delete existing users."""
+        """Delete existing users (unless :py:attr:`_shared_users` is set)."""
+        if cls._shared_users:
+            return
         User = get_user_model()  # NOQA
         User.objects.all().delete()
 
+    @classmethod
+    def _teardown_images(cls):
+        """Close and delete the images files written by :py:meth:`create_django_image`."""
+        while _images_files:
+            _images_files.pop().close()
+        while _images_dirs:
+            shutil.rmtree(_images_dirs.pop(), ignore_errors=True)
+
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
         cls._teardown_users()
+        cls._teardown_images()
 
     def create_user(
         self,
@@ -289,6 +470,27 @@ class CreateTestDataMixin:
         self.image_name = img_obj.name
         return img_obj
 
+    @classmethod
+    def _get_image_content(cls, mode="RGB", size=(800, 600), format="JPEG"):
+        """
+        Return the content of an image created by :py:meth:`create_image` encoded in the given format.
+
+        Content is encoded once per process for each combination of arguments.
+
+        :param mode: color mode
+        :param size: tuple of width, height
+        :param format: Pillow image format
+        :return: image content bytes
+        """
+        from io import BytesIO
+
+        key = (mode, tuple(size), format)
+        if key not in _images_content:
+            buffer = BytesIO()
+            cls.create_image(mode, size).save(buffer, format)
+            _images_content[key] = buffer.getvalue()
+        return _images_content[key]
+
     @classmethod
     def create_django_image(cls):
         """
@@ -298,21 +500,44 @@ class CreateTestDataMixin:
         * ``self.image_name``: the image base name
         * ``self.filename``: the complete image path
 
+        Image is written in a new temporary directory, using the content cached by :py:meth:`_get_image_content`;
+        the file is closed and the directory deleted on test class teardown.
+
         :return: (django file object, path to file image)
 
         It requires Pillow installed in the environment to work
         """
         from django.core.files import File as DjangoFile
 
-        img = cls.create_image()
         image_name = "test_file.jpg"
-        if settings.FILE_UPLOAD_TEMP_DIR:
-            tmp_dir = settings.FILE_UPLOAD_TEMP_DIR
-        else:
-            tmp_dir = mkdtemp()
+        tmp_dir = mkdtemp(dir=settings.FILE_UPLOAD_TEMP_DIR or None)
+        _images_dirs.append(tmp_dir)
         filename = os.path.join(tmp_dir, image_name)
-        img.save(filename, "JPEG")
-        return DjangoFile(open(filename, "rb"), name=image_name), filename
+        with open(filename, "wb") as image_file:
+            image_file.write(cls._get_image_content())
+        image_file = open(filename, "rb")  # NOQA: SIM115
+        _images_files.append(image_file)
+        return DjangoFile(image_file, name=image_name), filename
+
+    @classmethod
+    def create_django_image_content(cls, image_name="test_file.jpg", mode="RGB", size=(800, 600), format="JPEG"):
+        """
+        Create an in-memory django image file object suitable for FileField
+
+        Unlike :py:meth:`create_django_image` no file is written on disk: content is cached by
+        :py:meth:`_get_image_content` and shared by the returned objects.
+
+        :param image_name: image file name
+        :param mode: color mode
+        :param size: tuple of width, height
+        :param format: Pillow image format
+        :return: django content file object
+
+        It requires Pillow installed in the environment to work
+        """
+        from django.core.files.base import ContentFile
+
+        return ContentFile(cls._get_image_content(mode, size, format), name=image_name)
 
     def create_filer_image_object(self):
         """
@@ -354,6 +579,57 @@ class CreateTestDataMixin:
         filer_image = Image.objects.create(owner=user, file=file_obj, original_filename=image_name)
         return filer_image
 
+    @classmethod
+    def create_filer_images(cls, user, count, image_name="image_{}.jpg", thumbnails=False, **kwargs):
+        """
+        Create filer image objects sharing the same image file.
+
+        The first image is created like in :py:meth:`create_filer_image`, thus the file is saved (and the file save
+        receivers, e.g.: the ``easy_thumbnails`` ``saved_file`` ones, are run) once; the following images copy its
+        file and metadata.
+
+        Images are created by ``bulk_create`` if the image model does not use multi-table inheritance; as the
+        django-filer ``Image`` model extends ``File`` through multi-table inheritance, which ``bulk_create`` does not
+        support, images are saved one by one, in a single transaction.
+
+        As images share the same file, changes to the file of any image affect all of them.
+
+        :param user: images owner
+        :param count: number of images
+        :param image_name: images name, formatted with the image index (starting from 1)
+        :param thumbnails: generate the images default thumbnails (which are shared by the images too)
+        :param kwargs: images fields values
+        :return: list of filer image objects
+
+        It requires Pillow and django-filer installed in the environment to work
+
+        """
+        from django.db import router, transaction
+        from filer.models import Image
+
+        if count < 1:
+            return []
+        db = router.db_for_write(Image)
+        with transaction.atomic(using=db):
+            file_obj = cls.create_django_image_content()
+            image = Image.objects.using(db).create(
+                owner=user, file=file_obj, original_filename=image_name.format(1), **kwargs
+            )
+            fields = [field for field in Image._meta.concrete_fields if not field.primary_key]
+            copies = []
+            for index in range(2, count + 1):
+                copy = Image(**{field.attname: getattr(image, field.attname) for field in fields})
+                copy.original_filename = image_name.format(index)
+                copies.append(copy)
+            if Image._meta.parents:
+                for copy in copies:
+                    copy.save(using=db)
+            else:
+                copies = Image.objects.using(db).bulk_create(copies)
+        if thumbnails:
+            image.thumbnails  # NOQA: B018
+        return [image, *copies]
+
 
 class CMSPageRenderingMixin(RequestTestCaseMixin):
     """
@@ -362,6 +638,10 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
 
     languages = None
 
+    #: Restore :py:attr:`_pages_data` pages from a database snapshot in :py:meth:`get_pages`
+    #: (see :py:meth:`_get_pages_snapshot`)
+    _pages_snapshot = False
+
     _pages_data = ()
     """
     List of pages data for the different languages.
@@ -420,8 +700,58 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
 
         :return: list of created pages
         """
+        if self._pages_snapshot:
+            return self._get_pages_snapshot(self._pages_data, self.languages)
         return self.create_pages(self._pages_data, self.languages)
 
+    def _get_pages_snapshot(self, source, languages):
+        """
+        Create pages using :py:meth:`create_pages` the first time, and restore them from a database snapshot after.
+
+        Rows created by :py:meth:`create_pages` are kept in memory, keyed by the database and a fingerprint of the
+        pages data and languages; when the same pages are requested again (in the same test class or in any other
+        class), rows are inserted again with their primary keys, without calling :py:mod:`cms.api`.
+        Pages are created again if any of the rows already exists in the database.
+
+        Rows created outside of model ``save`` (e.g.: by ``bulk_create``) are not part of the snapshot; if
+        :py:meth:`create_pages` changes any row which is not part of the snapshot (e.g.: by ``QuerySet.update()`` or
+        raw queries), the snapshot is not used and pages are always created by :py:meth:`create_pages`.
+
+        :param source: pages data
+        :param languages: pages languages
+        :return: list of created pages
+        """
+        import hashlib
+        import json
+
+        from cms.models import Page
+        from django.db import DEFAULT_DB_ALIAS, connections
+
+        from .db_snapshot import ObjectsSnapshot
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        fingerprint = hashlib.sha256(
+            json.dumps([source, languages], sort_keys=True, default=repr).encode("utf-8")
+        ).hexdigest()
+        key = (connection.alias, connection.settings_dict["NAME"], fingerprint)
+        if key in _pages_snapshots:
+            snapshot, pks = _pages_snapshots[key]
+            if not snapshot.complete:
+                return self.create_pages(source, languages)
+            if snapshot.restore(connection.alias):
+                pages = Page.objects.in_bulk(pks)
+                from menus.menu_pool import menu_pool
+
+                menu_pool.clear(all=True)
+                if any(page.application_urls for page in pages.values()):
+                    reload_urls(settings, cms_apps=True)
+                return [pages[pk] for pk in pks]
+        snapshot = ObjectsSnapshot()
+        with snapshot.record(connection.alias):
+            pages = self.create_pages(source, languages)
+        _pages_snapshots[key] = snapshot, [page.pk for page in pages]
+        return pages
+
     @staticmethod
     def create_pages(source, languages):
         """
@@ -486,6 +816,19 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
         :return: PluginContext instance
         """
         from cms.plugin_rendering import PluginContext
+
+        context = self._get_rendering_context(page, lang, edit)
+        return PluginContext(context, plugin, plugin.placeholder)
+
+    def _get_rendering_context(self, page, lang, edit=False):
+        """
+        Build the base context to render plugins: toolbar request, content renderer and sekizai data.
+
+        :param page: Page object
+        :param lang: Current language
+        :param edit: Enable edit mode for rendering
+        :return: context dictionary
+        """
         from sekizai.context_processors import sekizai
 
         request = self.get_toolbar_request(page, self.user, lang=lang, edit=edit)
@@ -494,7 +837,7 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
         if renderer:
             context["cms_content_renderer"] = renderer
         context.update(sekizai(request))
-        return PluginContext(context, plugin, plugin.placeholder)
+        return context
 
     def render_plugin(self, page, lang, plugin, edit=False):
         """
@@ -511,6 +854,38 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
         rendered = content_renderer.render_plugin(instance=plugin, context=context, placeholder=plugin.placeholder)
         return rendered
 
+    def render_plugins(self, page, lang, plugins, edit=False):
+        """
+        Renders many plugins of the same page using CMSPlugin.render_plugin
+
+        Unlike :py:meth:`render_plugin`, the request, the toolbar and the content renderer are created once and
+        shared by all the plugins, thus sekizai data (and any other state kept in the content renderer) is
+        collected across plugins as when rendering a page.
+
+        :param page: Page object
+        :param lang: Current language
+        :param plugins: Plugin instances
+        :param edit: Enable edit mode for rendering
+        :return: (list of rendered plugins, list of render times in seconds), in the same order as ``plugins``
+        """
+        from cms.plugin_rendering import PluginContext
+
+        context = self._get_rendering_context(page, lang, edit)
+        content_renderer = context["cms_content_renderer"]
+        rendered = []
+        timings = []
+        for plugin in plugins:
+            start = time.perf_counter()
+            rendered.append(
+                content_renderer.render_plugin(
+                    instance=plugin,
+                    context=PluginContext(context, plugin, plugin.placeholder),
+                    placeholder=plugin.placeholder,
+                )
+            )
+            timings.append(time.perf_counter() - start)
+        return rendered, timings
+
     def get_page_request(self, page, user, path=None, edit=False, lang="en", use_middlewares=False, secure=False):
         """Deprecated, use :py:meth:`get_toolbar_request`."""
         warnings.warn(
@@ -542,7 +917,7 @@ class CMSPageRenderingMixin(RequestTestCaseMixin):
         if edit:
             path = "{}?{}".format(path, edit_on)
 
-        request = RequestFactory().get(path, secure=secure)
+        request = self._get_request_factory().get(path, secure=secure)
         return self._prepare_request(request, page, user, lang, use_middlewares, use_toolbar=True, secure=secure)
 
     def get_request(self, page, lang, user=None, path=None, use_middlewares=False, secure=False, use_toolbar=False):
@@ -652,7 +1027,34 @@ class GenericHelpersMixin:
             yield out, err
 
 
-class BaseNoDataTestCaseMixin(CreateTestDataMixin, CMSPageRenderingMixin, GenericHelpersMixin):
+class QueryBudgetMixin:
+    """
+    Record the queries executed by each test method and check them against the test :py:attr:`_query_budget`.
+
+    Queries are only recorded if the test has a budget or if the summary of the test run is requested (``test
+    --queries-summary``), see :py:func:`app_helper.query_budget.summary`.
+    """
+
+    #: Default :py:class:`~app_helper.query_budget.QueryBudget` of the test methods; test classes and methods can
+    #: also set it with the :py:func:`~app_helper.query_budget.query_budget` decorator
+    _query_budget = None
+
+    def _callTestMethod(self, method):
+        from django.db import connections
+
+        from .query_budget import is_collecting, record_queries
+
+        budget = getattr(method, "_query_budget", None) or self._query_budget
+        if not budget and not is_collecting():
+            return super()._callTestMethod(method)
+        databases = [connections[alias] for alias in sorted(getattr(self, "databases", ())) if alias in connections]
+        with record_queries(databases, self.id()) as record:
+            super()._callTestMethod(method)
+        if budget:
+            budget.check(record)
+
+
+class BaseNoDataTestCaseMixin(QueryBudgetMixin, CreateTestDataMixin, CMSPageRenderingMixin, GenericHelpersMixin):
     """
     Provide helper methods to setup and interact with Django testing framework.
 
@@ -660,6 +1062,7 @@ class BaseNoDataTestCaseMixin(CreateTestDataMixin, CMSPageRenderingMixin, Generi
 
     Implements:
 
+    * :py:class:`QueryBudgetMixin`
     * :py:class:`CreateTestDataMixin`
     * :py:class:`CMSPageRenderingMixin`
     * :py:class:`GenericHelpersMixin`
@@ -675,6 +1078,7 @@ class BaseTestCaseMixin(BaseNoDataTestCaseMixin):
 
     Implements:
 
+    * :py:class:`QueryBudgetMixin`
     * :py:class:`CreateTestDataMixin`
     * :py:class:`CMSPageRenderingMixin`
     * :py:class:`GenericHelpersMixin`
@@ -0,0 +1,212 @@
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+#: Default number of requests for each URL
+REQUESTS = 100
+
+#: Default number of concurrent requests
+CONCURRENCY = 1
+
+
+def percentile(values, percent):
+    """
+    Return the percentile of the values, using the nearest-rank method.
+
+    :param values: sorted values
+    :param percent: percentile, between 0 and 100
+    :return: percentile value, ``0`` if there are no values
+    """
+    if not values:
+        return 0
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return values[min(rank, len(values)) - 1]
+
+
+class BenchResult:
+    """Latencies and status codes of the requests to an URL."""
+
+    def __init__(self, url):
+        self.url = url
+        #: Latency of each request, in seconds
+        self.latencies = []
+        #: Status code of each response
+        self.statuses = []
+        #: Total time, in seconds
+        self.elapsed = 0
+
+    @property
+    def count(self):
+        """Number of requests."""
+        return len(self.latencies)
+
+    @property
+    def errors(self):
+        """Number of responses with a status code greater than or equal to 400."""
+        return len([status for status in self.statuses if status >= 400])
+
+    @property
+    def rps(self):
+        """Requests per second."""
+        return self.count / self.elapsed if self.elapsed else 0
+
+    def percentiles(self, *percents):
+        """Return the latency percentiles, in milliseconds."""
+        latencies = sorted(self.latencies)
+        return [percentile(latencies, percent) * 1000 for percent in percents]
+
+    @classmethod
+    def merge(cls, results, url="Total"):
+        """Combine the results of several URLs."""
+        total = cls(url)
+        for result in results:
+            total.latencies.extend(result.latencies)
+            total.statuses.extend(result.statuses)
+            total.elapsed += result.elapsed
+        return total
+
+
+def _wsgi_request(handler, factory, url):
+    environ = factory.get(url).environ
+    status = []
+
+    def start_response(response_status, headers, exc_info=None):
+        status.append(int(response_status.split(" ", 1)[0]))
+
+    start = time.perf_counter()
+    response = handler(environ, start_response)
+    try:
+        for __ in response:
+            pass
+    finally:
+        if hasattr(response, "close"):
+            response.close()
+    return time.perf_counter() - start, status[0]
+
+
+def _run_wsgi(url, requests, concurrency, factory):
+    """
+    Send the requests to the Django WSGI handler from ``concurrency`` threads, or from the current thread if
+    ``concurrency`` is 1.
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    result = BenchResult(url)
+    # warm up: the first request loads the views, templates, ...
+    _wsgi_request(handler, factory, url)
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(lambda __: _wsgi_request(handler, factory, url), range(requests)))
+    else:
+        responses = [_wsgi_request(handler, factory, url) for __ in range(requests)]
+    for latency, status in responses:
+        result.latencies.append(latency)
+        result.statuses.append(status)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+async def _asgi_request(handler, factory, url):
+    scope = factory.get(url).scope
+    status = []
+    received = []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        if not received:
+            received.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    start = time.perf_counter()
+    await handler(scope, receive, send)
+    latency = time.perf_counter() - start
+    disconnect.set()
+    return latency, status[0]
+
+
+def _run_asgi(url, requests, concurrency, factory):
+    """Send the requests to the Django ASGI handler, with up to ``concurrency`` requests in flight."""
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    result = BenchResult(url)
+
+    async def bench():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request():
+            async with semaphore:
+                return await _asgi_request(handler, factory, url)
+
+        await _asgi_request(handler, factory, url)
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(request() for __ in range(requests)))
+        result.elapsed = time.perf_counter() - start
+        for latency, status in responses:
+            result.latencies.append(latency)
+            result.statuses.append(status)
+
+    asyncio.run(bench())
+    return result
+
+
+def run(urls, requests=REQUESTS, concurrency=CONCURRENCY, user=None, use_asgi=False):
+    """
+    Send the requests to each URL, in process, through the Django WSGI (or ASGI) handler.
+
+    URLs are benchmarked one at a time, after a warm up request.
+
+    :param urls: URLs paths (and query strings)
+    :param requests: number of requests for each URL
+    :param concurrency: number of concurrent requests
+    :param user: username of the user the requests are authenticated as
+    :param use_asgi: use the ASGI handler instead of the WSGI one
+    :return: list of :py:class:`BenchResult`
+    """
+    from django.conf import settings
+    from django.test import AsyncRequestFactory, Client, RequestFactory
+
+    from .utils import get_user_model
+
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+    factory = AsyncRequestFactory() if use_asgi else RequestFactory()
+    if user:
+        client = Client()
+        client.force_login(get_user_model()._default_manager.get_by_natural_key(user))
+        factory.cookies = client.cookies
+    bench = _run_asgi if use_asgi else _run_wsgi
+    return [bench(url, requests, concurrency, factory) for url in urls]
+
+
+def report(results, per_url=False):
+    """
+    Return the table of the requests per second and latency percentiles.
+
+    :param results: list of :py:class:`BenchResult`
+    :param per_url: add a row for each URL
+    :return: report table
+    """
+    rows = results if per_url else []
+    rows = list(rows) + [BenchResult.merge(results)]
+    width = max(len(row.url) for row in rows)
+    lines = [
+        "{:<{width}} {:>8} {:>6} {:>9} {:>9} {:>9} {:>9}".format(
+            "URL", "Requests", "Errors", "Req/s", "p50 (ms)", "p95 (ms)", "p99 (ms)", width=width
+        )
+    ]
+    for row in rows:
+        lines.append(
+            "{:<{width}} {:>8} {:>6} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                row.url, row.count, row.errors, row.rps, *row.percentiles(50, 95, 99), width=width
+            )
+        )
+    return "\n".join(lines) + "\n"
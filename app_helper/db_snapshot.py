@@ -0,0 +1,153 @@
+import contextlib
+import re
+from collections import OrderedDict
+from copy import deepcopy
+
+#: Matches the table name of the ``INSERT`` / ``UPDATE`` / ``DELETE`` SQL statements
+_WRITE_STATEMENT = re.compile(r"^\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+[`\"\[]?([^\s`\"\]]+)", re.IGNORECASE)
+
+
+class ObjectsSnapshot:
+    """
+    Snapshot of the database rows created within :py:meth:`record`, which can be inserted again, with the same
+    primary keys, by :py:meth:`restore`.
+
+    Rows are tracked through ``post_save`` / ``post_delete`` signals, thus rows created by ``bulk_create`` or raw
+    queries are not part of the snapshot; ``INSERT`` / ``UPDATE`` / ``DELETE`` queries executed within
+    :py:meth:`record` are checked instead: if they changed any row which is not part of the snapshot (e.g.: a
+    ``QuerySet.update()`` on existing rows), the snapshot is not :py:attr:`complete` and it can't be restored.
+    """
+
+    def __init__(self):
+        #: Primary keys of the created rows, by concrete model, in creation order
+        self.created = OrderedDict()
+        #: Model instances, by model, in insertion order
+        self.rows = OrderedDict()
+        #: Rows of the tables written within :py:meth:`record`, before the first write, by model
+        self.initial = OrderedDict()
+        #: Models (or table names, if no model is found) with rows changed but not part of the snapshot
+        self.untracked = []
+
+    @property
+    def complete(self):
+        """Whether all the rows changed within :py:meth:`record` are part of the snapshot."""
+        return not self.untracked
+
+    @contextlib.contextmanager
+    def record(self, using="default"):
+        """
+        Track the rows created within the context and load them from the database on exit.
+
+        :param using: database alias
+        """
+        from django.apps import apps
+        from django.db import connections
+        from django.db.models.signals import post_delete, post_save
+
+        models = {
+            model._meta.db_table: model
+            for model in apps.get_models(include_auto_created=True)
+            if not model._meta.proxy
+        }
+
+        def written(execute, sql, params, many, context):
+            match = _WRITE_STATEMENT.match(sql) if isinstance(sql, str) else None
+            if match:
+                table = match.group(1)
+                model = models.get(table)
+                if not model:
+                    if table not in self.untracked:
+                        self.untracked.append(table)
+                elif model not in self.initial:
+                    self.initial[model] = self._get_state(model, using)
+            return execute(sql, params, many, context)
+
+        def saved(sender, instance, created, **kwargs):
+            if created and kwargs.get("using", using) == using:
+                self.created.setdefault(sender._meta.concrete_model, OrderedDict())[instance.pk] = True
+
+        def deleted(sender, instance, **kwargs):
+            self.created.get(sender._meta.concrete_model, {}).pop(instance.pk, None)
+
+        post_save.connect(saved, weak=False)
+        post_delete.connect(deleted, weak=False)
+        try:
+            with connections[using].execute_wrapper(written):
+                yield self
+        finally:
+            post_save.disconnect(saved)
+            post_delete.disconnect(deleted)
+        self._load(using)
+        self._check(using)
+
+    @staticmethod
+    def _get_state(model, using, exclude=()):
+        """Return the values of the model rows, ordered by primary key, excluding the given primary keys."""
+        fields = [field.attname for field in model._meta.local_concrete_fields]
+        queryset = model._base_manager.using(using).order_by("pk")
+        if exclude:
+            queryset = queryset.exclude(pk__in=list(exclude))
+        return list(queryset.values_list(*fields))
+
+    def _check(self, using):
+        """Detect changes to the rows which are not part of the snapshot in the tables written while recording."""
+        for model, initial in self.initial.items():
+            if self._get_state(model, using, exclude=self.rows.get(model, ())) != initial:
+                self.untracked.append(model)
+
+    def _add_rows(self, model, pks, using):
+        if not pks:
+            return
+        rows = self.rows.setdefault(model, OrderedDict())
+        for instance in model._base_manager.using(using).filter(pk__in=pks).order_by("pk"):
+            rows[instance.pk] = instance
+
+    def _load(self, using):
+        """Load the current state of the created rows, including parent models and many to many rows."""
+        for model, pks in self.created.items():
+            pks = list(pks)
+            for parent in reversed(model._meta.get_parent_list()):
+                self._add_rows(parent, pks, using)
+            self._add_rows(model, pks, using)
+            for field in model._meta.local_many_to_many:
+                through = field.remote_field.through
+                if through._meta.auto_created:
+                    through_pks = through._base_manager.using(using).filter(
+                        **{"{}__in".format(field.m2m_field_name()): pks}
+                    )
+                    self._add_rows(through, list(through_pks.values_list("pk", flat=True)), using)
+
+    def restore(self, using="default"):
+        """
+        Insert the rows in the database, unless any of them already exists or the snapshot is not
+        :py:attr:`complete`.
+
+        :param using: database alias
+        :return: ``True`` if rows have been restored
+        """
+        from django.core.management.color import no_style
+        from django.db import connections, transaction
+
+        def manager(model):
+            return model._base_manager.using(using)
+
+        if not self.complete:
+            return False
+        if any(manager(model).filter(pk__in=list(rows)).exists() for model, rows in self.rows.items()):
+            return False
+        with transaction.atomic(using=using):
+            for model, rows in self.rows.items():
+                instances = deepcopy(list(rows.values()))
+                if model._meta.parents:
+                    # bulk_create does not support multi-table inheritance, parents rows are inserted on their own
+                    for instance in instances:
+                        instance.save_base(raw=True, force_insert=True, using=using)
+                else:
+                    manager(model).bulk_create(instances)
+            connection = connections[using]
+            sequences_sql = connection.ops.sequence_reset_sql(no_style(), list(self.rows))
+            if sequences_sql:
+                with connection.cursor() as cursor:
+                    for sql in sequences_sql:
+                        cursor.execute(sql)
+        return True
@@ -0,0 +1,199 @@
+import codecs
+import json
+import os
+import socket
+import struct
+import sys
+import traceback
+
+from .migrations_cache import migrations_snapshot
+
+#: Default path of the unix socket used by ``serve-tests``
+DEFAULT_SOCKET = ".app_helper_tests.sock"
+
+#: Exit code trailer format sent by the server after the tests output
+_EXIT_CODE = struct.Struct("!i")
+
+
+def get_prepared_databases_runner(test_runner_class, databases_config):
+    """
+    Return a test runner class which reuses already created test databases.
+
+    Databases are owned by the caller, thus the returned runner does not create nor destroy them.
+
+    :param test_runner_class: test runner class
+    :param databases_config: value returned by the ``setup_databases`` method of the runner which created the databases
+    :return: test runner class
+    """
+
+    def setup_databases(self, **kwargs):
+        return databases_config
+
+    def teardown_databases(self, old_config, **kwargs):
+        pass
+
+    return type(
+        test_runner_class.__name__,
+        (test_runner_class,),
+        {
+            "setup_databases": setup_databases,
+            "teardown_databases": teardown_databases,
+            "__module__": test_runner_class.__module__,
+        },
+    )
+
+
+def _setup_databases(test_runner, verbose):
+    """Create the test databases once, using the given runner, if it supports it."""
+    from django.conf import settings
+    from django.test.utils import get_runner
+
+    test_runner_class = get_runner(settings, test_runner)
+    if not hasattr(test_runner_class, "setup_databases"):
+        # e.g.: pytest runner, which creates databases on its own
+        return None, None
+    runner = test_runner_class(verbosity=verbose, interactive=False)
+    with migrations_snapshot(getattr(settings, "APP_HELPER_MIGRATIONS_CACHE", None)):
+        return runner, runner.setup_databases()
+
+
+def _run_request(conn, request, application, test_runner, databases_config):
+    """Run the tests in the forked child, using the connection as stdout / stderr."""
+    from .main import test
+
+    os.dup2(conn.fileno(), 1)
+    os.dup2(conn.fileno(), 2)
+    sys.stdout = os.fdopen(1, "w", buffering=1, closefd=False)
+    sys.stderr = os.fdopen(2, "w", buffering=1, closefd=False)
+    failures = 1
+    try:
+        failures = test(
+            request.get("labels") or [],
+            application,
+            request.get("failfast", False),
+            request.get("runner") or test_runner,
+            request.get("runner_options"),
+            request.get("verbose", 1),
+            databases_config=databases_config,
+            changed_since=request.get("changed_since"),
+            queries_summary=request.get("queries_summary", False),
+        )
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(min(int(failures), 255))
+
+
+def _handle_request(conn, application, test_runner, databases_config):
+    """Fork a child to run the requested tests and send back its exit code."""
+    with conn.makefile("rb") as request_file:
+        request = json.loads(request_file.readline().decode("utf-8") or "{}")
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        _run_request(conn, request, application, test_runner, databases_config)
+    __, status = os.waitpid(pid, 0)
+    exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else 1
+    conn.sendall(_EXIT_CODE.pack(exit_code))
+
+
+def serve(application, test_runner, socket_path=None, verbose=1):
+    """
+    Run a server which forks the configured Django process to run tests.
+
+    The test databases are created once when the server starts; each request is served by a forked child process
+    which inherits the configured settings, the loaded applications and the databases.
+
+    Code loaded when the server starts (models, applications configuration, ...) is not reloaded: the server must be
+    restarted to pick any change to it.
+
+    :param application: application name
+    :param test_runner: dotted path of the default test runner
+    :param socket_path: path to the unix socket to listen on
+    :param verbose: verbosity level
+    """
+    from django.db import connections
+
+    try:
+        verbose = int(verbose)
+    except (ValueError, TypeError):
+        verbose = 1
+    socket_path = socket_path or DEFAULT_SOCKET
+    runner, databases_config = _setup_databases(test_runner, verbose)
+    # forked children must open their own connections, in-memory sqlite connections are kept alive by django
+    connections.close_all()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(1)
+    print("Test server listening on {}".format(socket_path))
+    sys.stdout.flush()
+    try:
+        while True:
+            conn, __ = server.accept()
+            with conn:
+                _handle_request(conn, application, test_runner, databases_config)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(socket_path)
+        if runner:
+            runner.teardown_databases(databases_config)
+
+
+def run_client(
+    socket_path=None,
+    test_labels=None,
+    failfast=False,
+    test_runner=None,
+    runner_options=None,
+    verbose=1,
+    changed_since=None,
+    queries_summary=False,
+):
+    """
+    Send a tests run request to the server started by ``serve-tests`` and stream back its output.
+
+    :param socket_path: path to the server unix socket
+    :param test_labels: list of test labels
+    :param failfast: option to stop the testsuite on the first error
+    :param test_runner: dotted path to the test runner (default to the one configured in the server)
+    :param runner_options: test runner options
+    :param verbose: verbosity level
+    :param changed_since: git reference to select the tests affected by the changes since it
+    :param queries_summary: report the tests executing the most queries
+    :return: tests run exit code
+    """
+    if isinstance(test_labels, str):  # pragma: no cover
+        test_labels = [test_labels]
+    request = {
+        "labels": test_labels or [],
+        "failfast": failfast,
+        "runner": test_runner,
+        "runner_options": runner_options,
+        "verbose": verbose,
+        "changed_since": changed_since,
+        "queries_summary": queries_summary,
+    }
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path or DEFAULT_SOCKET)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    tail = b""
+    with client:
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            # the last bytes of the stream are the exit code, they are kept aside until the end of the stream
+            data = tail + chunk
+            tail = data[-_EXIT_CODE.size :]
+            sys.stdout.write(decoder.decode(data[: -_EXIT_CODE.size]))
+            sys.stdout.flush()
+    sys.stdout.write(decoder.decode(b"", final=True))
+    if len(tail) != _EXIT_CODE.size:
+        return 1
+    return _EXIT_CODE.unpack(tail)[0]
@@ -9,8 +9,19 @@ import warnings
 from django.utils.encoding import force_str
 from docopt import DocoptExit, docopt
 
-from . import __version__
-from .utils import _create_db, _make_settings, ensure_unicoded_and_unique, persistent_dir, temp_dir, work_in
+from . import __version__, query_budget
+from .migrations_cache import migrations_snapshot
+from .request_profile import PROFILE_DIR
+from .startup_profile import profiler, startup_phase
+from .utils import (
+    _create_db,
+    _get_extra_settings_file,
+    _make_settings,
+    ensure_unicoded_and_unique,
+    persistent_dir,
+    temp_dir,
+    work_in,
+)
 
 __doc__ = """django CMS applications development helper script.
 
@@ -18,15 +29,17 @@ To use a different database, set the DATABASE_URL environment variable to a
 dj-database-url compatible value.
 
 Usage:
-    django-app-helper <application> test [--failfast] [--migrate] [--no-migrate] [<test-label>...] [--xvfb] [--runner=<test.runner.class>] [--extra-settings=</path/to/settings.py>] [--cms] [--runner-options=<option1>,<option2>] [--native] [--persistent] [--persistent-path=<path>] [--verbose=<level>]
-    django-app-helper <application> cms_check [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate]
-    django-app-helper <application> compilemessages [--extra-settings=</path/to/settings.py>] [--cms]
-    django-app-helper <application> makemessages [--extra-settings=</path/to/settings.py>] [--cms] [--locale=locale]
-    django-app-helper <application> makemigrations [--extra-settings=</path/to/settings.py>] [--cms] [--merge] [--empty] [--dry-run] [<extra-applications>...]
-    django-app-helper <application> authors [--extra-settings=</path/to/settings.py>] [--cms]
-    django-app-helper <application> server [--port=<port>] [--bind=<bind>] [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate] [--persistent | --persistent-path=<path>] [--verbose=<level>] [--use-daphne] [--use-channels]
-    django-app-helper <application> setup [--extra-settings=</path/to/settings.py>] [--cms]
-    django-app-helper <application> <command> [options] [--extra-settings=</path/to/settings.py>] [--cms] [--persistent] [--persistent-path=<path>] [--migrate] [--no-migrate]
+    django-app-helper <application> test [--failfast] [--migrate] [--no-migrate] [<test-label>...] [--xvfb] [--runner=<test.runner.class>] [--extra-settings=</path/to/settings.py>] [--cms] [--runner-options=<option1>,<option2>] [--native] [--persistent] [--persistent-path=<path>] [--verbose=<level>] [--parallel=<processes>] [--use-server] [--socket=<path>] [--migrations-cache=<path>] [--changed-since=<ref>] [--queries-summary] [--profile-startup=<path>]
+    django-app-helper <application> serve-tests [--runner=<test.runner.class>] [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate] [--socket=<path>] [--migrations-cache=<path>] [--verbose=<level>] [--profile-startup=<path>]
+    django-app-helper <application> cms_check [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate] [--migrations-cache=<path>] [--profile-startup=<path>]
+    django-app-helper <application> compilemessages [--extra-settings=</path/to/settings.py>] [--cms] [--profile-startup=<path>]
+    django-app-helper <application> makemessages [--extra-settings=</path/to/settings.py>] [--cms] [--locale=locale] [--profile-startup=<path>]
+    django-app-helper <application> makemigrations [--extra-settings=</path/to/settings.py>] [--cms] [--merge] [--empty] [--dry-run] [<extra-applications>...] [--profile-startup=<path>]
+    django-app-helper <application> authors [--extra-settings=</path/to/settings.py>] [--cms] [--profile-startup=<path>]
+    django-app-helper <application> server [--port=<port>] [--bind=<bind>] [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate] [--persistent | --persistent-path=<path>] [--verbose=<level>] [--use-daphne] [--use-channels] [--migrations-cache=<path>] [--workers=<workers>] [--no-reload] [--watch=<paths>] [--reload-debounce=<seconds>] [--profile=<dir>] [--profile-startup=<path>]
+    django-app-helper <application> bench <url>... [--requests=<requests>] [--concurrency=<concurrency>] [--user=<user>] [--asgi] [--per-url] [--extra-settings=</path/to/settings.py>] [--cms] [--migrate] [--no-migrate] [--migrations-cache=<path>] [--profile-startup=<path>]
+    django-app-helper <application> setup [--extra-settings=</path/to/settings.py>] [--cms] [--profile-startup=<path>]
+    django-app-helper <application> <command> [options] [--extra-settings=</path/to/settings.py>] [--cms] [--persistent] [--persistent-path=<path>] [--migrate] [--no-migrate] [--profile-startup=<path>]
 
 Options:
     -h --help                   Show this screen.
@@ -44,10 +57,27 @@ Options:
     --extra-settings=</path/to/settings.py>     Filesystem path to a custom app_helper file which defines custom settings
     --runner=<test.runner.class>                Dotted path to a custom test runner
     --runner-options=<option1>,<option2>        Comma separated list of command line options for the test runner
+    --parallel=<processes>                      Run tests in parallel processes (number of processes or "auto")
+    --use-server                                Run tests using the server started by serve-tests command
+    --changed-since=<ref>                       Only run the tests affected by the changes since the given git reference
+    --queries-summary                           Report the tests executing the most queries at the end of the test run
+    --migrations-cache=<path>                   Directory where migrated SQLite databases snapshots are cached
+    --socket=<path>                             Path of the serve-tests unix socket [default: .app_helper_tests.sock]
     --port=<port>                               Port to listen on [default: 8000].
     --bind=<bind>                               Interface to bind to [default: 127.0.0.1].
     --use-channels                              Run the channels runserver instead of the Django one
     --use-daphne                                Run the Daphne runserver instead of the Django one
+    --workers=<workers>                         Serve from the given number of pre-forked processes, without reloader
+    --no-reload                                 Run the server without the autoreloader
+    --watch=<paths>                             Comma separated list of additional paths watched by the autoreloader
+    --reload-debounce=<seconds>                 Seconds to wait for further changes before reloading the server
+    --profile=<dir>                             Profile the server requests, saving the slowest ones cProfile dumps to the directory (--profile alone uses .app_helper_profiles)
+    --requests=<requests>                       Number of requests sent to each URL by bench command (default: 100)
+    --concurrency=<concurrency>                 Number of concurrent requests sent by bench command (default: 1)
+    --user=<user>                               Username of the user bench requests are authenticated as
+    --asgi                                      Send bench requests through the ASGI handler instead of the WSGI one
+    --per-url                                   Report bench results for each URL
+    --profile-startup=<path>                    Print the time spent in each startup phase, or save it as JSON to the path (--profile-startup alone prints it)
     <extra-applications>                        Comma separated list of applications to create migrations for
 """  # NOQA # nopyflakes
 
@@ -61,7 +91,16 @@ def _parse_runner_options(test_runner_class, options):
     return {}  # pragma: no cover
 
 
-def _test_run_worker(test_labels, test_runner, failfast=False, runner_options=None, verbose=1):
+def _test_run_worker(
+    test_labels,
+    test_runner,
+    failfast=False,
+    runner_options=None,
+    verbose=1,
+    parallel=None,
+    databases_config=None,
+    queries_summary=False,
+):
     warnings.filterwarnings(
         "error",
         r"DateTimeField received a naive datetime",
@@ -80,6 +119,19 @@ def _test_run_worker(test_labels, test_runner, failfast=False, runner_options=No
     TestRunner = get_runner(settings)  # NOQA
 
     kwargs = {"verbosity": verbose, "interactive": False, "failfast": failfast}
+    if parallel:
+        if "PytestTestRunner" in test_runner:
+            # pytest-xdist handles "auto" on its own
+            kwargs["parallel"] = parallel
+        else:
+            from .parallel import get_parallel_runner, parse_parallel
+
+            kwargs["parallel"] = parse_parallel(parallel)
+            TestRunner = get_parallel_runner(TestRunner)  # NOQA
+    if databases_config is not None:
+        from .fork_server import get_prepared_databases_runner
+
+        TestRunner = get_prepared_databases_runner(TestRunner, databases_config)  # NOQA
     if runner_options:
         if "PytestTestRunner" in test_runner:
             kwargs["pytest_args"] = runner_options
@@ -90,15 +142,36 @@ def _test_run_worker(test_labels, test_runner, failfast=False, runner_options=No
             extra.update(kwargs)
             kwargs = extra
     test_runner = TestRunner(**kwargs)
-    failures = test_runner.run_tests(test_labels)
+    with contextlib.ExitStack() as stack:
+        if queries_summary:
+            records = stack.enter_context(query_budget.collect_records())
+        with migrations_snapshot(getattr(settings, "APP_HELPER_MIGRATIONS_CACHE", None)):
+            failures = test_runner.run_tests(test_labels)
+    if queries_summary:
+        sys.stderr.write(query_budget.summary(records))
     return failures
 
 
-def test(test_labels, application, failfast=False, test_runner=None, runner_options=None, verbose=1):
+def test(
+    test_labels,
+    application,
+    failfast=False,
+    test_runner=None,
+    runner_options=None,
+    verbose=1,
+    parallel=None,
+    databases_config=None,
+    changed_since=None,
+    queries_summary=False,
+):
     """
     Runs the test suite
     :param test_labels: space separated list of test labels
     :param failfast: option to stop the testsuite on the first error
+    :param parallel: number of parallel processes (or ``auto``)
+    :param databases_config: already created test databases configuration (used by ``serve-tests``)
+    :param changed_since: git reference to select the tests affected by the changes since it
+    :param queries_summary: report the tests executing the most queries
     """
     if not test_labels and "PytestTestRunner" not in test_runner:
         if os.path.exists("tests"):  # pragma: no cover
@@ -107,8 +180,20 @@ def test(test_labels, application, failfast=False, test_runner=None, runner_opti
             test_labels = ["%s.tests" % application]
     elif isinstance(test_labels, str):  # pragma: no cover
         test_labels = [test_labels]
+    if changed_since:
+        from .test_selection import select_test_labels
+
+        selected_labels = select_test_labels(
+            test_labels, application, changed_since, pytest="PytestTestRunner" in test_runner
+        )
+        if selected_labels is not None:
+            if not selected_labels:
+                return 0
+            test_labels = selected_labels
     runner_options = runner_options or []
-    return _test_run_worker(test_labels, test_runner, failfast, runner_options, verbose)
+    return _test_run_worker(
+        test_labels, test_runner, failfast, runner_options, verbose, parallel, databases_config, queries_summary
+    )
 
 
 def compilemessages(application):
@@ -143,6 +228,7 @@ def cms_check(migrate_cmd=False):
         import cms  # NOQA # nopyflakes
 
         _create_db(migrate_cmd)
+        profiler.report()
         call_command("cms", "check")
     except ImportError:  # pragma: no cover
         print("cms_check available only if django CMS is installed")
@@ -200,18 +286,46 @@ def generate_authors():
 
 
 def server(
-    settings, bind="127.0.0.1", port=8000, migrate_cmd=False, verbose=1, use_channels=False, use_daphne=False
+    settings,
+    bind="127.0.0.1",
+    port=8000,
+    migrate_cmd=False,
+    verbose=1,
+    use_channels=False,
+    use_daphne=False,
+    workers=None,
+    reload=True,
+    helper_file=None,
 ):  # pragma: no cover
     from .server import run
 
-    run(settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne)
+    run(settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne, workers, reload, helper_file)
+
+
+def bench(urls, requests=None, concurrency=None, user=None, use_asgi=False, per_url=False, migrate_cmd=False):
+    from .bench import CONCURRENCY, REQUESTS, report, run
+    from .server import _setup_db
+
+    _setup_db(migrate_cmd)
+    results = run(urls, int(requests or REQUESTS), int(concurrency or CONCURRENCY), user, use_asgi)
+    print(report(results, per_url), end="")
+
+
+def serve_tests(application, test_runner, socket_path=None, verbose=1):  # pragma: no cover
+    from .fork_server import serve
+
+    serve(application, test_runner, socket_path, verbose)
 
 
 def setup_env(settings):
     return settings
 
 
+@startup_phase("_map_argv")
 def _map_argv(argv, application_module):
+    # --profile and --profile-startup options arguments are optional
+    argv = ["--profile={}".format(PROFILE_DIR) if arg == "--profile" else arg for arg in argv]
+    argv = ["--profile-startup=" if arg == "--profile-startup" else arg for arg in argv]
     try:
         # by default docopt uses sys.argv[1:]; ensure correct args passed
         args = docopt(__doc__, argv=argv[1:], version=application_module.__version__)
@@ -249,6 +363,22 @@ def core(args, application):
         RuntimeWarning,
         r"django\.db\.models\.fields",
     )
+    if args["test"] and args.get("--use-server"):
+        from .fork_server import run_client
+
+        # tests are run by the serve-tests process, no need to configure django here
+        sys.exit(
+            run_client(
+                args.get("--socket"),
+                args["<test-label>"],
+                args["--failfast"],
+                args["--runner"],
+                args["--runner-options"],
+                args.get("--verbose") or 1,
+                args.get("--changed-since"),
+                args.get("--queries-summary", False),
+            )
+        )
     if args["--persistent"]:
         create_dir = persistent_dir
         if args["--persistent-path"]:
@@ -276,13 +406,18 @@ def core(args, application):
                         option != "--cms"
                         and "--extra-settings" not in option
                         and not option.startswith("--persistent")
+                        and not option.startswith("--profile-startup")
                     )
                 ]
                 _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT)
+                profiler.report()
                 execute_from_command_line(options)
 
             else:
                 _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT)
+                if not args["server"] and not args["cms_check"] and not args.get("bench"):
+                    # database setup is part of the startup for these commands, report is printed later
+                    profiler.report()
                 # run
                 if args["test"]:
                     if args["--runner"]:
@@ -313,8 +448,18 @@ def core(args, application):
                             runner,
                             args["--runner-options"],
                             args.get("--verbose", 1),
+                            args.get("--parallel"),
+                            changed_since=args.get("--changed-since"),
+                            queries_summary=args.get("--queries-summary", False),
                         )
                         sys.exit(num_failures)
+                elif args.get("serve-tests"):
+                    serve_tests(
+                        application,
+                        args["--runner"] or settings.TEST_RUNNER,
+                        args.get("--socket"),
+                        args.get("--verbose", 1),
+                    )
                 elif args["server"]:
                     server(
                         settings,
@@ -324,6 +469,19 @@ def core(args, application):
                         args.get("--verbose", 1),
                         args.get("--use-channels", False),
                         args.get("--use-daphne", False),
+                        args.get("--workers"),
+                        not args.get("--no-reload", False),
+                        _get_extra_settings_file(args),
+                    )
+                elif args.get("bench"):
+                    bench(
+                        args["<url>"],
+                        args.get("--requests"),
+                        args.get("--concurrency"),
+                        args.get("--user"),
+                        args.get("--asgi", False),
+                        args.get("--per-url", False),
+                        args.get("--migrate", True),
                     )
                 elif args["cms_check"]:
                     cms_check(args.get("--migrate", True))
@@ -349,12 +507,17 @@ def main(argv=sys.argv):  # pragma: no cover
     # Command is executed in the main directory of the plugin, and we must
     # include it in the current path for the imports to work
     sys.path.insert(0, ".")
+    # startup phases are recorded before arguments are parsed
+    for arg in argv:
+        if arg.startswith("--profile-startup"):
+            profiler.enable(arg.partition("=")[2])
     if len(argv) > 1:
-        application = argv[1]
-        # ensure that argv, are unique and the same type as doc string
-        argv = ensure_unicoded_and_unique(argv, application)
-        application_module = __import__(application)
-        args = _map_argv(argv, application_module)
-        return core(args=args, application=application)
+        with startup_phase("main"):
+            application = argv[1]
+            # ensure that argv, are unique and the same type as doc string
+            argv = ensure_unicoded_and_unique(argv, application)
+            application_module = __import__(application)
+            args = _map_argv(argv, application_module)
+            return core(args=args, application=application)
     else:
         args = docopt(__doc__, version=__version__)
@@ -0,0 +1,117 @@
+import contextlib
+import hashlib
+import os
+import sqlite3
+from importlib import import_module
+
+import django
+
+
+def _module_files(module):
+    """Return the python files of the given module (or package)."""
+    module_file = getattr(module, "__file__", None)
+    if hasattr(module, "__path__"):
+        files = []
+        for path in module.__path__:
+            for root, __, filenames in os.walk(path):
+                files.extend(os.path.join(root, filename) for filename in filenames if filename.endswith(".py"))
+        return sorted(files)
+    if module_file:
+        return [module_file]
+    return []  # pragma: no cover
+
+
+def migrations_fingerprint(connection):
+    """
+    Compute a fingerprint of the database schema generated by migrations for the given connection.
+
+    It's computed from the Django version, the database engine and the migrations of all the installed applications
+    (the models modules for applications without migrations).
+
+    :param connection: database connection
+    :return: fingerprint hex digest
+    """
+    from django.apps import apps
+    from django.db.migrations.loader import MigrationLoader
+
+    digest = hashlib.sha256()
+    digest.update(django.get_version().encode("utf-8"))
+    digest.update(connection.alias.encode("utf-8"))
+    digest.update(connection.settings_dict["ENGINE"].encode("utf-8"))
+    for app_config in apps.get_app_configs():
+        digest.update(app_config.label.encode("utf-8"))
+        files = []
+        module_name, __ = MigrationLoader.migrations_module(app_config.label)
+        if module_name:
+            try:
+                files = _module_files(import_module(module_name))
+            except ImportError:
+                pass
+        if not files and app_config.models_module:
+            files = _module_files(app_config.models_module)
+        for path in files:
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as source:
+                digest.update(source.read())
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def migrations_snapshot(cache_dir):
+    """
+    Context manager which restores migrated SQLite databases from a snapshot cache.
+
+    When a new (empty) SQLite database is opened within the context, it's restored from the snapshot matching
+    its :py:func:`migrations_fingerprint`, thus ``migrate`` has no migration to apply.
+    If no snapshot exists, the database is saved in the cache once ``migrate`` completes.
+
+    Databases with any existing table are never touched.
+
+    :param cache_dir: snapshots directory (caching is disabled if empty)
+    """
+    from django.apps import apps
+    from django.db.backends.signals import connection_created
+    from django.db.models.signals import post_migrate
+
+    if not cache_dir:
+        yield
+        return
+    #: snapshot path of the databases to be saved after migrate
+    pending = {}
+    #: databases already checked
+    seen = set()
+
+    def restore_snapshot(sender, connection, **kwargs):
+        database = (connection.alias, connection.settings_dict["NAME"])
+        if connection.vendor != "sqlite" or database in seen:
+            return
+        seen.add(database)
+        if connection.connection.execute("SELECT count(*) FROM sqlite_master").fetchone()[0]:
+            return
+        snapshot = os.path.join(cache_dir, "{}.sqlite3".format(migrations_fingerprint(connection)))
+        if os.path.exists(snapshot):
+            with contextlib.closing(sqlite3.connect(snapshot)) as source:
+                source.backup(connection.connection)
+        else:
+            pending[connection.alias] = snapshot
+
+    def save_snapshot(sender, app_config, using, **kwargs):
+        from django.db import connections
+
+        last_app = [config for config in apps.get_app_configs() if config.models_module][-1]
+        if app_config != last_app or using not in pending:
+            return
+        snapshot = pending.pop(using)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_snapshot = "{}.{}".format(snapshot, os.getpid())
+        with contextlib.closing(sqlite3.connect(temp_snapshot)) as target:
+            connections[using].connection.backup(target)
+        os.replace(temp_snapshot, snapshot)
+
+    connection_created.connect(restore_snapshot, weak=False)
+    post_migrate.connect(save_snapshot, weak=False)
+    try:
+        yield
+    finally:
+        connection_created.disconnect(restore_snapshot)
+        post_migrate.disconnect(save_snapshot)
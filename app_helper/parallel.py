@@ -0,0 +1,102 @@
+import os
+
+import django
+from django.test.runner import ParallelTestSuite
+
+try:
+    from django.test.runner import _init_worker
+except ImportError:  # pragma: no cover
+    _init_worker = None
+
+#: Django versions range (inclusive, exclusive) the private parallel worker API used to isolate the workers storage
+#: directories (``django.test.runner._init_worker`` and ``django.test.runner._worker_id``) is known to work with
+WORKER_API_VERSIONS = ((3, 2), (6, 0))
+
+
+def parse_parallel(value):
+    """
+    Convert the ``--parallel`` command line value to a number of processes.
+
+    :param value: number of processes or ``auto`` to use all the available cores
+    :return: number of processes (``0`` disables parallel execution)
+    """
+    if not value:
+        return 0
+    if value == "auto":
+        try:
+            from django.test.runner import get_max_test_processes
+        except ImportError:  # pragma: no cover
+            from django.test.runner import default_test_processes as get_max_test_processes
+        return get_max_test_processes()
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("--parallel must be a number or 'auto', got {!r}".format(value))
+
+
+def has_worker_api():
+    """
+    Check whether the Django private parallel worker API can be used with the installed Django version.
+
+    :return: bool
+    """
+    from django.test import runner
+
+    min_version, max_version = WORKER_API_VERSIONS
+    return (
+        min_version <= django.VERSION[:2] < max_version and _init_worker is not None and hasattr(runner, "_worker_id")
+    )
+
+
+def _get_worker_id():
+    """Return the id of the current Django parallel test worker."""
+    from django.test import runner
+
+    return runner._worker_id
+
+
+def _init_app_helper_worker(*args, **kwargs):
+    """
+    Initialize a parallel test worker.
+
+    On top of the standard Django worker initialization (which switches to the cloned test database), it gives
+    each worker its own ``STATIC_ROOT`` / ``MEDIA_ROOT`` directories inside the ones created for the test run.
+    """
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    _init_worker(*args, **kwargs)
+    worker_dirs = {}
+    for setting in ("STATIC_ROOT", "MEDIA_ROOT"):
+        base_dir = getattr(settings, setting, None)
+        if base_dir:
+            worker_dirs[setting] = os.path.join(base_dir, "worker_{}".format(_get_worker_id()))
+            os.makedirs(worker_dirs[setting], exist_ok=True)
+    # Enabled for the whole worker lifetime: it also resets the storages caches via setting_changed signal
+    override_settings(**worker_dirs).enable()
+
+
+class AppHelperParallelTestSuite(ParallelTestSuite):
+    """Parallel test suite which isolates each worker storage directories."""
+
+    init_worker = _init_app_helper_worker
+
+
+def get_parallel_runner(test_runner_class):
+    """
+    Return a test runner class which runs the test suite using :py:class:`AppHelperParallelTestSuite`.
+
+    Runners not based on Django ``DiscoverRunner`` are returned unchanged; they are returned unchanged as well if
+    the Django private parallel worker API is not known to work with the installed Django version
+    (see :py:func:`has_worker_api`): workers then share the ``STATIC_ROOT`` / ``MEDIA_ROOT`` directories.
+
+    :param test_runner_class: test runner class
+    :return: test runner class
+    """
+    if not hasattr(test_runner_class, "parallel_test_suite") or not has_worker_api():
+        return test_runner_class
+    return type(
+        test_runner_class.__name__,
+        (test_runner_class,),
+        {"parallel_test_suite": AppHelperParallelTestSuite, "__module__": test_runner_class.__module__},
+    )
@@ -5,10 +5,11 @@ import shlex
 class PytestTestRunner:
     """Runs pytest to discover and run tests."""
 
-    def __init__(self, verbosity=1, failfast=False, keepdb=False, **kwargs):
+    def __init__(self, verbosity=1, failfast=False, keepdb=False, parallel=0, **kwargs):
         self.verbosity = verbosity
         self.failfast = failfast
         self.keepdb = keepdb
+        self.parallel = parallel
         self.extra_args = kwargs.pop("pytest_args", "")
 
     def run_tests(self, test_labels, *args, **kwargs):
@@ -21,6 +22,7 @@ class PytestTestRunner:
         self.verbosity = kwargs.get("verbosity", self.verbosity)
         self.failfast = kwargs.get("failfast", self.failfast)
         self.keepdb = kwargs.get("keepdb", self.keepdb)
+        self.parallel = kwargs.get("parallel", self.parallel)
         argv = shlex.split(os.environ.get("PYTEST_ARGS", ""))
         if self.extra_args:
             argv.extend(shlex.split(self.extra_args))
@@ -34,6 +36,16 @@ class PytestTestRunner:
             argv.append("--exitfirst")
         if self.keepdb:  # pragma: no cover
             argv.append("--reuse-db")
+        if self.parallel:
+            # pytest-django creates a test database for each worker
+            try:
+                import xdist  # NOQA: F401
+            except ImportError:
+                raise ImportError(
+                    "Running pytest tests in parallel requires pytest-xdist: install it with "
+                    "`pip install django-app-helper[xdist]`"
+                )
+            argv.extend(["--numprocesses", str(self.parallel)])
 
         argv.extend(test_labels)
         return pytest.main(argv)
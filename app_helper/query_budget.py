@@ -0,0 +1,212 @@
+import contextlib
+import re
+from collections import Counter, namedtuple
+
+#: Queries statistics of the tests run within :py:func:`collect_records`, in execution order (``None`` outside of it)
+_records = None
+
+#: Queries statistics of a test: test id, number of queries, queries time and executions of the most repeated statement
+QueryStats = namedtuple("QueryStats", ["test", "count", "time", "repeated"])
+
+#: Number of repetitions of the same statement which flags a test in :py:func:`summary`
+REPEATED_THRESHOLD = 5
+
+_STRINGS_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LISTS_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def normalize_sql(sql):
+    """
+    Replace the literal values in the SQL statement with placeholders.
+
+    Statements which only differ in their parameters (e.g.: the ones executed by N+1 patterns) have the same
+    normalized SQL.
+
+    :param sql: SQL statement
+    :return: normalized SQL statement
+    """
+    sql = _STRINGS_RE.sub("?", sql)
+    sql = _NUMBERS_RE.sub("?", sql)
+    return _LISTS_RE.sub("(...)", sql)
+
+
+class QueryRecord:
+    """Queries executed by a test."""
+
+    def __init__(self, test=None):
+        #: Test id
+        self.test = test
+        #: List of (database alias, SQL, time in seconds) of the executed queries
+        self.queries = []
+
+    @property
+    def count(self):
+        """Number of executed queries."""
+        return len(self.queries)
+
+    @property
+    def time(self):
+        """Total queries time, in seconds."""
+        return sum(query_time for __, __, query_time in self.queries)
+
+    @property
+    def repeated(self):
+        """
+        Most repeated statement.
+
+        :return: (normalized SQL, number of executions), or ``(None, 0)`` if no query has been executed
+        """
+        statements = Counter(normalize_sql(sql) for __, sql, __ in self.queries)
+        if not statements:
+            return None, 0
+        return statements.most_common(1)[0]
+
+    def stats(self):
+        """Return the :py:class:`QueryStats` of the record."""
+        return QueryStats(self.test, self.count, self.time, self.repeated[1])
+
+
+class QueryBudget:
+    """
+    Maximum number of queries, queries time and repetitions of the same statement allowed in a test.
+
+    :param queries: maximum number of queries
+    :param time: maximum queries time, in seconds
+    :param repeated: maximum number of executions of the same statement (see :py:func:`normalize_sql`)
+    """
+
+    def __init__(self, queries=None, time=None, repeated=None):
+        self.queries = queries
+        self.time = time
+        self.repeated = repeated
+
+    def __repr__(self):
+        return "QueryBudget(queries={!r}, time={!r}, repeated={!r})".format(self.queries, self.time, self.repeated)
+
+    def check(self, record):
+        """
+        Check the record against the budget.
+
+        :param record: :py:class:`QueryRecord` instance
+        :raise AssertionError: if the budget is exceeded
+        """
+        errors = []
+        if self.queries is not None and record.count > self.queries:
+            errors.append("{} queries executed, budget is {}".format(record.count, self.queries))
+        if self.time is not None and record.time > self.time:
+            errors.append("queries took {:.3f}s, budget is {:.3f}s".format(record.time, self.time))
+        statement, executions = record.repeated
+        if self.repeated is not None and executions > self.repeated:
+            errors.append(
+                "statement executed {} times, budget is {} (N+1 queries?): {}".format(
+                    executions, self.repeated, statement
+                )
+            )
+        if errors:
+            raise AssertionError("Query budget exceeded: {}".format("; ".join(errors)))
+
+
+def query_budget(queries=None, time=None, repeated=None):
+    """
+    Decorator which sets the :py:class:`QueryBudget` of a test method or of all the test methods of a test class.
+
+    Budgets are checked by the test classes in :py:mod:`app_helper.base_test`.
+
+    Usage::
+
+        @query_budget(queries=10, repeated=2)
+        def test_plugin(self):
+            ...
+
+    :param queries: maximum number of queries
+    :param time: maximum queries time, in seconds
+    :param repeated: maximum number of executions of the same statement
+    """
+    budget = QueryBudget(queries, time, repeated)
+
+    def decorator(test):
+        test._query_budget = budget
+        return test
+
+    return decorator
+
+
+def is_collecting():
+    """Check if the queries statistics of the tests are collected by :py:func:`collect_records`."""
+    return _records is not None
+
+
+@contextlib.contextmanager
+def collect_records():
+    """
+    Collect the queries statistics of the tests run within the context, for :py:func:`summary`.
+
+    Records collected by an outer context (e.g.: when running tests of tests) are restored on exit.
+
+    :return: list of :py:class:`QueryStats`
+    """
+    global _records
+
+    previous = _records
+    _records = []
+    try:
+        yield _records
+    finally:
+        _records = previous
+
+
+@contextlib.contextmanager
+def record_queries(connections, test=None):
+    """
+    Record the queries executed within the context on the given connections.
+
+    The record statistics are collected if within :py:func:`collect_records`.
+
+    :param connections: database connections
+    :param test: test id
+    :return: :py:class:`QueryRecord` instance
+    """
+    from django.test.utils import CaptureQueriesContext
+
+    record = QueryRecord(test)
+    contexts = [CaptureQueriesContext(connection) for connection in connections]
+    try:
+        with contextlib.ExitStack() as stack:
+            for context in contexts:
+                stack.enter_context(context)
+            yield record
+    finally:
+        for context in contexts:
+            for query in context.captured_queries:
+                record.queries.append((context.connection.alias, query["sql"], float(query["time"])))
+        if _records is not None:
+            _records.append(record.stats())
+
+
+def summary(records, limit=10):
+    """
+    Return the table of the tests which executed the most queries.
+
+    :param records: list of :py:class:`QueryStats`, as collected by :py:func:`collect_records`
+    :param limit: number of tests
+    :return: summary table, empty string if no query has been recorded
+    """
+    records = sorted((record for record in records if record.count), key=lambda record: -record.count)[:limit]
+    if not records:
+        return ""
+    lines = [
+        "Tests executing the most queries:",
+        "{:>8} {:>9} {:>9}  {}".format("Queries", "Time (s)", "Repeated", "Test"),
+    ]
+    for record in records:
+        lines.append(
+            "{:>8} {:>9.3f} {:>9}  {}{}".format(
+                record.count,
+                record.time,
+                record.repeated,
+                record.test,
+                " (possible N+1 queries)" if record.repeated >= REPEATED_THRESHOLD else "",
+            )
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,294 @@
+import ctypes
+import errno
+import fnmatch
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+from pathlib import Path
+
+from django.utils import autoreload
+
+logger = logging.getLogger("django.utils.autoreload")
+
+#: Seconds without further changes to wait before reloading, so that changes to several files trigger a single reload
+DEBOUNCE = 0.2
+
+#: File and directory names which never trigger a reload
+IGNORED_PATTERNS = ("*.pyc", "*.pyo", "*~", "*.swp", "*.swx", "4913", ".*", "__pycache__", "node_modules")
+
+# inotify constants, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyUnavailable(RuntimeError):
+    pass
+
+
+def _libc():
+    libc = ctypes.CDLL(None, use_errno=True)
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+
+def watched_paths(settings, helper_file=None):
+    """
+    Return the paths watched by default by the server autoreloader.
+
+    They are the application package, the helper file, the ``TEMPLATES`` directories, the ``LOCALE_PATHS``, the
+    ``MEDIA_ROOT`` (changes invalidate the :py:mod:`app_helper.static_files` index, without reloading) and the paths in
+    the ``APP_HELPER_WATCH_PATHS`` setting.
+
+    :param settings: Django settings
+    :param helper_file: path of the helper file
+    :return: list of absolute paths
+    """
+    from importlib import import_module
+
+    paths = []
+    application = getattr(settings, "BASE_APPLICATION", None)
+    if application:
+        try:
+            module = import_module(application)
+        except ImportError:
+            module = None
+        module_file = getattr(module, "__file__", None)
+        if module_file:
+            if os.path.basename(module_file) == "__init__.py":
+                paths.append(os.path.dirname(module_file))
+            else:
+                paths.append(module_file)
+    if helper_file:
+        paths.append(helper_file)
+    for backend in getattr(settings, "TEMPLATES", []):
+        paths.extend(backend.get("DIRS", []))
+    paths.extend(getattr(settings, "LOCALE_PATHS", []))
+    if getattr(settings, "MEDIA_ROOT", None):
+        paths.append(settings.MEDIA_ROOT)
+    paths.extend(getattr(settings, "APP_HELPER_WATCH_PATHS", None) or [])
+    return list(dict.fromkeys(os.path.abspath(str(path)) for path in paths))
+
+
+def _ignored(name):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in IGNORED_PATTERNS)
+
+
+def _parse_events(data):
+    """
+    Unpack the ``inotify_event`` structs read from the inotify file descriptor.
+
+    :param data: bytes read from the inotify file descriptor
+    :return: iterator of (watch descriptor, events mask, file name)
+    """
+    offset = 0
+    while offset < len(data):
+        wd, mask, __, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+        offset += length
+        yield wd, mask, name
+
+
+class InotifyReloader(autoreload.BaseReloader):
+    """
+    Autoreloader based on the Linux inotify API.
+
+    Unlike the Django reloaders, which watch all the imported modules, only the given paths are watched: directories
+    are watched recursively, files are watched through their parent directory, thus files replaced by editors on save
+    are tracked too.
+
+    Changes are notified through the Django ``file_changed`` signal, so template and translations changes reset the
+    Django caches without restarting the server; other changes restart it once no further change happens for
+    ``debounce`` seconds.
+
+    :param paths: files and directories to watch
+    :param debounce: seconds to wait for further changes before reloading
+    """
+
+    def __init__(self, paths, debounce=DEBOUNCE):
+        super().__init__()
+        self.paths = [os.path.abspath(path) for path in paths]
+        self.debounce = debounce
+        self._fd = None
+        #: Watched directory and names of the watched files (``None`` if all files are watched), by watch descriptor
+        self._watches = {}
+
+    @classmethod
+    def check_availability(cls):
+        if not sys.platform.startswith("linux"):
+            raise InotifyUnavailable("inotify is only available on Linux")
+        try:
+            _libc()
+        except (AttributeError, OSError):
+            raise InotifyUnavailable("inotify is not supported by the C library")
+
+    def watched_files(self, include_globs=True):
+        for path in self.paths:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs[:] = [name for name in dirs if not _ignored(name)]
+                    for name in files:
+                        if not _ignored(name):
+                            yield Path(root, name)
+            elif os.path.exists(path):
+                yield Path(path)
+
+    def _add_watch(self, path, name=None):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                logger.warning("Unable to watch %s: inotify watches limit reached.", path)
+            elif error not in (errno.ENOENT, errno.ENOTDIR):
+                logger.debug("Unable to watch %s: %s.", path, os.strerror(error))
+            return
+        __, names = self._watches.get(wd, (path, set()))
+        if name is None or names is None:
+            names = None
+        else:
+            names = names | {name}
+        self._watches[wd] = (path, names)
+
+    def _add_tree(self, path):
+        for root, dirs, __ in os.walk(path):
+            dirs[:] = [name for name in dirs if not _ignored(name)]
+            self._add_watch(root)
+
+    def _start(self):
+        self._libc = _libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for path in self.paths:
+            if os.path.isdir(path):
+                self._add_tree(path)
+            else:
+                self._add_watch(os.path.dirname(path), os.path.basename(path))
+        logger.debug("Watching %s directories with inotify.", len(self._watches))
+
+    def _read_events(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for filesystem events.
+
+        :return: list of the changed paths
+        """
+        changed = []
+        try:
+            ready, __, __ = select.select([self._fd], [], [], timeout)
+        except InterruptedError:  # pragma: no cover
+            return changed
+        if not ready:
+            return changed
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:  # pragma: no cover
+            return changed
+        for wd, mask, name in _parse_events(data):
+            path = self._handle_event(wd, mask, name)
+            if path:
+                changed.append(path)
+        return changed
+
+    def _handle_event(self, wd, mask, name):
+        """
+        Update the watches according to an inotify event.
+
+        :return: the changed path, or ``None`` if the event is not relevant
+        """
+        if mask & IN_Q_OVERFLOW:
+            # events have been lost: any watched path may have changed
+            return self.paths[0]
+        if wd not in self._watches:
+            return None
+        directory, names = self._watches[wd]
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return None
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            return directory if names is None else None
+        if _ignored(name) or (names is not None and name not in names):
+            return None
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+            self._add_tree(path)
+        return path
+
+    def tick(self):
+        self._start()
+        try:
+            while True:
+                changed = self._read_events(1)
+                if changed:
+                    while True:
+                        more = self._read_events(self.debounce)
+                        if not more:
+                            break
+                        changed.extend(more)
+                    for path in dict.fromkeys(changed):
+                        self.notify_file_changed(Path(path))
+                yield
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._watches = {}
+
+
+def get_reloader(paths, debounce=DEBOUNCE):
+    """
+    Return the inotify reloader watching the given paths if available, the default Django reloader otherwise (or if
+    no path is given).
+
+    :param paths: files and directories to watch
+    :param debounce: seconds to wait for further changes before reloading
+    """
+    try:
+        InotifyReloader.check_availability()
+    except InotifyUnavailable:
+        return autoreload.get_reloader()
+    if not paths:
+        return autoreload.get_reloader()
+    return InotifyReloader(paths, debounce)
+
+
+def run_with_reloader(main_func, *args, watch_paths=None, debounce=DEBOUNCE, **kwargs):
+    """
+    Run the function in a child process restarted by the reloader returned by :py:func:`get_reloader`.
+
+    Counterpart of ``django.utils.autoreload.run_with_reloader``.
+
+    :param main_func: function to run
+    :param watch_paths: files and directories to watch
+    :param debounce: seconds to wait for further changes before reloading
+    """
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    try:
+        if os.environ.get(autoreload.DJANGO_AUTORELOAD_ENV) == "true":
+            reloader = get_reloader(watch_paths or [], debounce)
+            logger.info("Watching for file changes with %s", reloader.__class__.__name__)
+            autoreload.start_django(reloader, main_func, *args, **kwargs)
+        else:
+            exit_code = autoreload.restart_with_reloader()
+            sys.exit(exit_code)
+    except KeyboardInterrupt:
+        pass
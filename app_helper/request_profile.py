@@ -0,0 +1,187 @@
+import contextlib
+import cProfile
+import os
+import re
+import threading
+import time
+from collections import deque
+
+#: Directory used by ``server --profile`` when no directory is given
+PROFILE_DIR = ".app_helper_profiles"
+
+#: URL prefix of the profiles index (requests to this prefix are not profiled)
+PROFILE_URL = "__profile__/"
+
+#: Default minimum request duration, in milliseconds, to save the cProfile dump of the request
+THRESHOLD = 200
+
+#: Number of requests listed in the index
+RECENT_REQUESTS = 100
+
+#: Profiles of the recent requests, most recent last
+_profiles = deque(maxlen=RECENT_REQUESTS)
+
+#: Only one request at a time is profiled by cProfile; concurrent requests only record the timings
+_profiler_lock = threading.Lock()
+
+_FILENAME_RE = re.compile(r"[^\w.-]+")
+
+
+class RequestProfile:
+    """Timings of a request."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.timestamp = time.time()
+        self.status = None
+        #: Wall time, in milliseconds
+        self.wall = 0
+        #: CPU time of the request thread, in milliseconds
+        self.cpu = 0
+        #: Number of SQL queries
+        self.queries = 0
+        #: SQL queries time, in milliseconds
+        self.queries_time = 0
+        #: Templates rendering time, in milliseconds (``None`` if the request has not been profiled by cProfile)
+        self.templates_time = None
+        #: Name of the cProfile dump file, in the profiles directory
+        self.dump = None
+
+    def dump_name(self):
+        """Return the name of the cProfile dump file of the request."""
+        path = _FILENAME_RE.sub("_", self.path.strip("/")) or "root"
+        return "{}-{}-{}-{:.0f}ms.prof".format(
+            time.strftime("%Y%m%d%H%M%S", time.localtime(self.timestamp)), self.method, path[:80], self.wall
+        )
+
+
+def _templates_time(profiler):
+    """Return the cumulative time spent in ``Template.render``, in milliseconds, from the cProfile stats."""
+    import pstats
+
+    from django.template.base import Template
+
+    code = Template.render.__code__
+    stats = pstats.Stats(profiler).stats
+    for (filename, lineno, name), (__, __, __, cumulative, __) in stats.items():
+        if filename == code.co_filename and lineno == code.co_firstlineno and name == code.co_name:
+            return cumulative * 1000
+    return 0
+
+
+class ProfilingMiddleware:
+    """
+    Record the wall time, CPU time, SQL queries count and time and templates rendering time of each request.
+
+    Added at the top of ``MIDDLEWARE`` by ``server --profile``; requests slower than the
+    ``APP_HELPER_PROFILE_THRESHOLD`` setting (in milliseconds) have their cProfile stats dumped in the
+    ``APP_HELPER_PROFILE_DIR`` directory.
+    Recent requests are listed by :py:func:`profiles_index`.
+    """
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        self.get_response = get_response
+        self.directory = getattr(settings, "APP_HELPER_PROFILE_DIR", None) or PROFILE_DIR
+        self.threshold = getattr(settings, "APP_HELPER_PROFILE_THRESHOLD", None)
+        if self.threshold is None:
+            self.threshold = THRESHOLD
+        self.prefix = "/{}".format(PROFILE_URL)
+
+    def __call__(self, request):
+        from django.db import connections
+
+        if request.path.startswith(self.prefix):
+            return self.get_response(request)
+        profile = RequestProfile(request.method, request.get_full_path())
+
+        def count_queries(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                profile.queries += 1
+                profile.queries_time += (time.perf_counter() - start) * 1000
+
+        profiler = cProfile.Profile() if _profiler_lock.acquire(blocking=False) else None
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_queries))
+                wall_start = time.perf_counter()
+                cpu_start = time.thread_time()
+                if profiler:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler:
+                        profiler.disable()
+                    profile.cpu = (time.thread_time() - cpu_start) * 1000
+                    profile.wall = (time.perf_counter() - wall_start) * 1000
+            profile.status = response.status_code
+            if profiler:
+                profile.templates_time = _templates_time(profiler)
+                if profile.wall >= self.threshold:
+                    os.makedirs(self.directory, exist_ok=True)
+                    profile.dump = profile.dump_name()
+                    profiler.dump_stats(os.path.join(self.directory, profile.dump))
+        finally:
+            if profiler:
+                _profiler_lock.release()
+            _profiles.append(profile)
+        return response
+
+
+def profiles_index(request):
+    """
+    List the recent requests, slowest first.
+
+    Served at ``PROFILE_URL`` when ``server --profile`` is enabled.
+    """
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.utils.html import format_html, format_html_join
+
+    def dump_link(profile):
+        if not profile.dump:
+            return ""
+        return format_html('<a href="{}">{}</a>', "/{}{}".format(PROFILE_URL, profile.dump), profile.dump)
+
+    def milliseconds(value):
+        return "" if value is None else "{:.1f}".format(value)
+
+    profiles = sorted(_profiles, key=lambda profile: -profile.wall)
+    rows = format_html_join(
+        "\n",
+        "<tr>{}</tr>".format("<td>{}</td>" * 10),
+        (
+            (
+                time.strftime("%H:%M:%S", time.localtime(profile.timestamp)),
+                profile.method,
+                profile.path,
+                profile.status,
+                milliseconds(profile.wall),
+                milliseconds(profile.cpu),
+                profile.queries,
+                milliseconds(profile.queries_time),
+                milliseconds(profile.templates_time),
+                dump_link(profile),
+            )
+            for profile in profiles
+        ),
+    )
+    directory = os.path.abspath(getattr(settings, "APP_HELPER_PROFILE_DIR", None) or PROFILE_DIR)
+    return HttpResponse(
+        format_html(
+            "<!DOCTYPE html><html><head><title>Requests profiles</title></head><body>"
+            "<h1>Recent requests</h1><p>cProfile dumps directory: {}</p>"
+            "<table><thead><tr><th>Time</th><th>Method</th><th>Path</th><th>Status</th><th>Wall (ms)</th>"
+            "<th>CPU (ms)</th><th>Queries</th><th>Queries (ms)</th><th>Templates (ms)</th><th>cProfile dump</th>"
+            "</tr></thead><tbody>{}</tbody></table></body></html>",
+            directory,
+            rows,
+        )
+    )
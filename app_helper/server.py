@@ -1,35 +1,155 @@
+import atexit
+import hashlib
+import json
+import os
+import signal
+import socket
+import tempfile
+import traceback
+
 from django.utils import autoreload
 
+from .reloader import DEBOUNCE, run_with_reloader, watched_paths
+from .startup_profile import profiler
 from .utils import _create_db, create_user, get_user_model
 
+#: Environment variable with the path of the file storing the database fingerprint across autoreloader restarts
+STATE_VARIABLE = "APP_HELPER_SERVER_STATE"
+
+
+def _reloader_options(settings, helper_file):
+    """Return the options of :py:func:`app_helper.reloader.run_with_reloader` for the given settings."""
+    return {
+        "watch_paths": watched_paths(settings, helper_file),
+        "debounce": float(getattr(settings, "APP_HELPER_RELOAD_DEBOUNCE", None) or DEBOUNCE),
+    }
 
-def _run_django(settings, bind, port, migrate_cmd, verbose):
+
+def _run_django(settings, bind, port, migrate_cmd, verbose, reload=True, helper_file=None):
     """Run channels runserver."""
     from django.core.management.commands import runserver
 
     _setup_db(migrate_cmd)
-    _init_runserver(runserver, bind, port, verbose)
+    _init_runserver(
+        runserver, bind, port, verbose, reload=reload, reloader_options=_reloader_options(settings, helper_file)
+    )
 
 
-def _run_daphne(settings, bind, port, migrate_cmd, verbose):
+def _run_daphne(settings, bind, port, migrate_cmd, verbose, reload=True, helper_file=None):
     """Run daphne runserver."""
     from daphne.cli import CommandLineInterface
 
     _setup_db(migrate_cmd)
     daphne_args = ["-b", bind, "-p", port, "-v", verbose or "1", settings.ASGI_APPLICATION]
-    autoreload.run_with_reloader(CommandLineInterface().run, daphne_args)
+    if reload:
+        run_with_reloader(CommandLineInterface().run, daphne_args, **_reloader_options(settings, helper_file))
+    else:
+        CommandLineInterface().run(daphne_args)
 
 
-def _run_channels(settings, bind, port, migrate_cmd, verbose):
+def _run_channels(settings, bind, port, migrate_cmd, verbose, reload=True, helper_file=None):
     """Run channels runserver."""
     from channels.management.commands import runserver
 
     _setup_db(migrate_cmd)
-    _init_runserver(runserver, bind, port, verbose, channels=True)
+    _init_runserver(
+        runserver,
+        bind,
+        port,
+        verbose,
+        channels=True,
+        reload=reload,
+        reloader_options=_reloader_options(settings, helper_file),
+    )
+
+
+def _run_workers(settings, bind, port, migrate_cmd, verbose, workers, use_daphne=False):
+    """
+    Serve the application from pre-forked worker processes sharing the listening socket.
+
+    Database is initialized once, before forking the workers; each worker serves one request at a time, using the
+    Django WSGI server (or Daphne ASGI server, if ``use_daphne`` is set).
+    Server stops when all the workers exit, or on ``SIGINT`` / ``SIGTERM``.
+    """
+    from django.db import connections
 
+    _setup_db(migrate_cmd)
+    listener = socket.create_server((bind, int(port)), backlog=128)
+    listener.set_inheritable(True)
+    # connections must not be shared with the workers
+    connections.close_all()
+    target = _daphne_worker if use_daphne else _wsgi_worker
+
+    children = set()
+    for __ in range(workers):
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            exit_code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                target(settings, listener, verbose)
+            except BaseException:
+                traceback.print_exc()
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        children.add(pid)
+    print("Serving on http://{}:{}/ with {} workers (pids: {})".format(bind, port, workers, sorted(children)))
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous_handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        while children:
+            try:
+                pid, __ = os.wait()
+            except ChildProcessError:
+                break
+            children.discard(pid)
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        listener.close()
+
+
+def _wsgi_worker(settings, listener, verbose):
+    """Serve the WSGI application on the given socket."""
+    from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer, get_internal_wsgi_application
+
+    # static and media files are served by app_helper.static_files views
+    handler = get_internal_wsgi_application()
+    server = WSGIServer(listener.getsockname()[:2], WSGIRequestHandler, bind_and_activate=False)
+    server.socket.close()
+    server.socket = listener
+    server.server_address = listener.getsockname()
+    server.server_name = socket.getfqdn(server.server_address[0])
+    server.server_port = server.server_address[1]
+    server.setup_environ()
+    server.set_app(handler)
+    server.serve_forever()
+
+
+def _daphne_worker(settings, listener, verbose):
+    """Serve the ASGI application on the given socket with Daphne."""
+    from daphne.cli import CommandLineInterface
 
-def _init_runserver(runserver_module, bind, port, verbose, logger=None, channels=False):
-    """Run base django / channels runserver with autoreloader."""
+    CommandLineInterface().run(["--fd", str(listener.fileno()), "-v", verbose or "1", settings.ASGI_APPLICATION])
+
+
+def _init_runserver(
+    runserver_module, bind, port, verbose, logger=None, channels=False, reload=True, reloader_options=None
+):
+    """
+    Run base django / channels runserver, with autoreloader unless ``reload`` is ``False``.
+
+    ``reloader_options`` are passed to :py:func:`app_helper.reloader.run_with_reloader`.
+    """
     rs = runserver_module.Command()
     rs.use_ipv6 = False
     rs._raw_ipv6 = False
@@ -40,22 +160,75 @@ def _init_runserver(runserver_module, bind, port, verbose, logger=None, channels
     if channels:
         rs.http_timeout = 60
         rs.websocket_handshake_timeout = 5
-    autoreload.run_with_reloader(
-        rs.inner_run,
-        **{
-            "addrport": "{}:{}".format(bind, port),
-            "insecure_serving": True,
-            "use_static_handler": True,
-            "use_threading": True,
-            "verbosity": verbose,
-            "skip_checks": True,
-            "use_reloader": True,
-        },
+    options = {
+        "addrport": "{}:{}".format(bind, port),
+        "insecure_serving": True,
+        "use_static_handler": True,
+        "use_threading": True,
+        "verbosity": verbose,
+        "skip_checks": True,
+        "use_reloader": reload,
+    }
+    if reload:
+        run_with_reloader(rs.inner_run, **(reloader_options or {}), **options)
+    else:
+        rs.inner_run(**options)
+
+
+def _database_fingerprint(migrate_cmd):
+    """
+    Compute a fingerprint of the default database and of its migrations.
+
+    It changes if the migrations (see :py:func:`app_helper.migrations_cache.migrations_fingerprint`), the database
+    connection settings or the SQLite database file change.
+    """
+    from django.db import connection
+
+    from .migrations_cache import migrations_fingerprint
+
+    settings_dict = connection.settings_dict
+    digest = hashlib.sha256()
+    digest.update(migrations_fingerprint(connection).encode("utf-8"))
+    digest.update(
+        json.dumps([settings_dict.get(key) for key in ("ENGINE", "NAME", "HOST", "PORT")], default=str).encode("utf-8")
     )
+    digest.update(str(bool(migrate_cmd)).encode("utf-8"))
+    if connection.vendor == "sqlite" and not connection.is_in_memory_db():
+        try:
+            stat = os.stat(settings_dict["NAME"])
+            digest.update("{}:{}".format(stat.st_dev, stat.st_ino).encode("utf-8"))
+        except OSError:
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+def _read_state(path):
+    try:
+        with open(path) as state:
+            return state.read()
+    except OSError:
+        return None
+
+
+def _remove_state(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
 
 
 def _setup_db(migrate_cmd):
-    """Initialize the database running migrations and creating the default user."""
+    """
+    Initialize the database running migrations and creating the default user.
+
+    The database fingerprint (see :py:func:`_database_fingerprint`) is stored at the end of the setup: processes
+    restarted by the autoreloader skip the setup if the fingerprint is unchanged.
+    """
+    state_path = os.environ.get(STATE_VARIABLE)
+    reloaded = os.environ.get(autoreload.DJANGO_AUTORELOAD_ENV) == "true" and state_path
+    if reloaded and _read_state(state_path) == _database_fingerprint(migrate_cmd):
+        profiler.report()
+        return
     _create_db(migrate_cmd)
     User = get_user_model()  # NOQA
     if not User.objects.filter(is_superuser=True).exists():
@@ -63,9 +236,20 @@ def _setup_db(migrate_cmd):
         print("")
         print("A admin user (username: %s, password: admin) " "has been created." % usr.get_username())
         print("")
+    if not reloaded:
+        # state file is shared by the processes started by the autoreloader
+        fd, state_path = tempfile.mkstemp(prefix="app_helper_server_", suffix=".state")
+        os.close(fd)
+        atexit.register(_remove_state, state_path)
+        os.environ[STATE_VARIABLE] = state_path
+    with open(state_path, "w") as state:
+        state.write(_database_fingerprint(migrate_cmd))
+    profiler.report()
 
 
-def run(settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne):
+def run(
+    settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne, workers=None, reload=True, helper_file=None
+):
     """
     Run runserver command with reloader enabled.
 
@@ -85,6 +269,12 @@ def run(settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne):
     :type use_channels: bool
     :param use_daphne: run daphne server
     :type use_daphne: bool
+    :param workers: number of pre-forked worker processes (the autoreloader is disabled when set)
+    :type workers: int
+    :param reload: run the server with the autoreloader
+    :type reload: bool
+    :param helper_file: path of the helper file, watched by the autoreloader
+    :type helper_file: str
     """
     try:
         from channels.management.commands import runserver  # noqa: F401
@@ -98,9 +288,11 @@ def run(settings, bind, port, migrate_cmd, verbose, use_channels, use_daphne):
         daphne_enabled = True
     except ImportError:
         daphne_enabled = False
-    if use_channels and channels_enabled:
-        _run_channels(settings, bind, port, migrate_cmd, verbose)
+    if workers:
+        _run_workers(settings, bind, port, migrate_cmd, verbose, int(workers), use_daphne and daphne_enabled)
+    elif use_channels and channels_enabled:
+        _run_channels(settings, bind, port, migrate_cmd, verbose, reload, helper_file)
     elif use_daphne and daphne_enabled:
-        _run_daphne(settings, bind, port, migrate_cmd, verbose)
+        _run_daphne(settings, bind, port, migrate_cmd, verbose, reload, helper_file)
     else:
-        _run_django(settings, bind, port, migrate_cmd, verbose)
+        _run_django(settings, bind, port, migrate_cmd, verbose, reload, helper_file)
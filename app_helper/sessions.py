@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.sessions.backends.base import CreateError, SessionBase, UpdateError
+
+#: Sessions data and expiry timestamp, by session key
+_sessions = {}
+
+
+def clear_sessions():
+    """Delete all the sessions."""
+    _sessions.clear()
+
+
+class SessionStore(SessionBase):
+    """
+    In-process session store, used as ``SESSION_ENGINE`` in test mode.
+
+    Sessions data is stored as a shallow copy of the session dictionary, with no serialization, thus it's only
+    available in the current process and it's lost on exit. Sessions are cleared after each test by the test classes
+    in :py:mod:`app_helper.base_test`.
+    """
+
+    def load(self):
+        data, expiry = _sessions.get(self.session_key, (None, 0))
+        if data is not None and expiry > time.time():
+            return dict(data)
+        self._session_key = None
+        return {}
+
+    def exists(self, session_key):
+        return bool(session_key) and session_key in _sessions
+
+    def create(self):
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create and self.exists(self.session_key):
+            raise CreateError
+        if not must_create and not self.exists(self.session_key):
+            raise UpdateError
+        _sessions[self.session_key] = (
+            dict(self._get_session(no_load=must_create)),
+            time.time() + self.get_expiry_age(),
+        )
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        _sessions.pop(session_key, None)
+
+    @classmethod
+    def clear_expired(cls):
+        now = time.time()
+        for session_key, (__, expiry) in list(_sessions.items()):
+            if expiry <= now:
+                _sessions.pop(session_key, None)
@@ -0,0 +1,218 @@
+import copy
+import hashlib
+import json
+import os
+import sys
+
+import django
+
+#: Environment variables which affect the generated settings
+ENVIRONMENT_VARIABLES = ("DATABASE_URL", "AUTH_USER_MODEL")
+
+#: Environment variable to set the directory of the settings disk cache (the cache is disabled if not set)
+CACHE_DIR_VARIABLE = "APP_HELPER_SETTINGS_CACHE"
+
+#: Key used to mark values which are not plain JSON values in the serialized settings
+_MARKER = "__app_helper__"
+
+#: In-process cache
+_cache = {}
+
+#: Installed distributions names and versions, see :py:func:`installed_distributions`
+_distributions = []
+
+
+class Placeholder:
+    """
+    Setting value which is replaced by the value passed to :py:func:`resolve_placeholders`.
+
+    Used for values which change on every run (e.g.: temporary directories) and thus cannot be cached.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Placeholder) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return "Placeholder({!r})".format(self.name)
+
+
+def resolve_placeholders(settings, **values):
+    """
+    Replace the top level :py:class:`Placeholder` settings with the given values.
+
+    :param settings: settings dictionary
+    :param values: placeholder values
+    :return: settings dictionary
+    """
+    for key, value in settings.items():
+        if isinstance(value, Placeholder):
+            settings[key] = values[value.name]
+    return settings
+
+
+def is_enabled():
+    """Check if the settings cache is enabled by the ``APP_HELPER_SETTINGS_CACHE`` environment variable."""
+    return bool(os.environ.get(CACHE_DIR_VARIABLE))
+
+
+def installed_distributions():
+    """
+    Return the names and versions of the distributions installed in the Python environment.
+
+    :return: sorted list of ``name==version`` strings
+    """
+    from importlib.metadata import distributions
+
+    if not _distributions:
+        _distributions.extend(
+            sorted({"{}=={}".format(dist.metadata["Name"], dist.version) for dist in distributions()})
+        )
+    return _distributions
+
+
+def settings_cache_key(args, application, extra_settings_file):
+    """
+    Compute the cache key of the settings generated for the given arguments.
+
+    Key depends on the helper file content, the environment variables in :py:data:`ENVIRONMENT_VARIABLES`, the
+    command line arguments, the Python environment (and the installed distributions) and the Django version.
+
+    :param args: docopt arguments
+    :param application: application module name
+    :param extra_settings_file: path of the helper file
+    :return: key hex digest
+    """
+    from . import __version__
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps(args, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(application.encode("utf-8"))
+    digest.update(json.dumps({name: os.environ.get(name) for name in ENVIRONMENT_VARIABLES}).encode("utf-8"))
+    digest.update("{}:{}:{}".format(sys.prefix, django.get_version(), __version__).encode("utf-8"))
+    digest.update("\n".join(installed_distributions()).encode("utf-8"))
+    try:
+        with open(extra_settings_file, "rb") as helper:
+            digest.update(os.path.abspath(extra_settings_file).encode("utf-8"))
+            digest.update(helper.read())
+    except (OSError, TypeError):
+        digest.update(b"no helper")
+    return digest.hexdigest()
+
+
+def encode_settings(value):
+    """
+    Convert the settings to JSON serializable values.
+
+    Tuples, :py:class:`Placeholder` and :py:class:`app_helper.utils.DisableMigrations` are converted to marker
+    dictionaries.
+
+    :raise TypeError: if any value cannot be converted
+    """
+    from .utils import DisableMigrations
+
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, list):
+        return [encode_settings(item) for item in value]
+    if isinstance(value, tuple):
+        return {_MARKER: "tuple", "items": [encode_settings(item) for item in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value) or _MARKER in value:
+            raise TypeError("Unsupported settings dictionary keys: {!r}".format(list(value)))
+        return {key: encode_settings(item) for key, item in value.items()}
+    if isinstance(value, Placeholder):
+        return {_MARKER: "placeholder", "name": value.name}
+    if isinstance(value, DisableMigrations):
+        return {_MARKER: "DisableMigrations"}
+    raise TypeError("Unsupported settings value: {!r}".format(value))
+
+
+def decode_settings(value):
+    """Convert the values created by :py:func:`encode_settings` back to the settings values."""
+    from .utils import DisableMigrations
+
+    if isinstance(value, list):
+        return [decode_settings(item) for item in value]
+    if isinstance(value, dict):
+        marker = value.get(_MARKER)
+        if marker == "tuple":
+            return tuple(decode_settings(item) for item in value["items"])
+        if marker == "placeholder":
+            return Placeholder(value["name"])
+        if marker == "DisableMigrations":
+            return DisableMigrations()
+        return {key: decode_settings(item) for key, item in value.items()}
+    return value
+
+
+def _cache_path(key):
+    cache_dir = os.environ.get(CACHE_DIR_VARIABLE)
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, "settings-{}.json".format(key))
+
+
+def get_cached_settings(key):
+    """
+    Return a copy of the settings cached for the given key.
+
+    Settings are looked up in the in-process cache first, then in the disk cache; the cache is only enabled by the
+    ``APP_HELPER_SETTINGS_CACHE`` environment variable.
+
+    :param key: key computed by :py:func:`settings_cache_key`
+    :return: settings dictionary or ``None``
+    """
+    if not is_enabled():
+        return None
+    if key in _cache:
+        return copy.deepcopy(_cache[key])
+    path = _cache_path(key)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path) as cache_file:
+            settings = decode_settings(json.load(cache_file))
+    except (OSError, ValueError):
+        return None
+    _cache[key] = copy.deepcopy(settings)
+    return settings
+
+
+def set_cached_settings(key, settings):
+    """
+    Store the settings in the cache.
+
+    Settings which cannot be copied are not cached; settings which cannot be serialized are only cached in process.
+
+    :param key: key computed by :py:func:`settings_cache_key`
+    :param settings: settings dictionary
+    """
+    if not is_enabled():
+        return
+    try:
+        _cache[key] = copy.deepcopy(settings)
+    except Exception:  # pragma: no cover
+        return
+    path = _cache_path(key)
+    if not path:
+        return
+    try:
+        data = json.dumps(encode_settings(settings), sort_keys=True)
+    except TypeError:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = "{}.{}".format(path, os.getpid())
+    with open(temp_path, "w") as cache_file:
+        cache_file.write(data)
+    os.replace(temp_path, path)
+
+
+def clear_cache():
+    """Clear the in-process cache."""
+    _cache.clear()
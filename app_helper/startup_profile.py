@@ -0,0 +1,140 @@
+import contextlib
+import json
+import sys
+import time
+
+
+class Phase:
+    """Timing of a startup phase and its nested phases."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = None
+        self.children = []
+
+    @property
+    def duration(self):
+        """Phase duration in milliseconds (up to now if the phase is still running)."""
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "duration": round(self.duration, 3),
+            "children": [child.as_dict() for child in self.children],
+        }
+
+
+class StartupProfiler:
+    """Collect the timings of the nested startup phases."""
+
+    def __init__(self):
+        self.enabled = False
+        self.output = None
+        self.reported = False
+        self.phases = []
+        self._stack = []
+
+    def enable(self, output=None):
+        """
+        Enable startup timings collection.
+
+        :param output: path of the JSON report file (the report is printed on stdout if empty)
+        """
+        self.enabled = True
+        self.output = output
+        self.reported = False
+        self.phases = []
+        self._stack = []
+
+    def push(self, name):
+        phase = Phase(name)
+        if self._stack:
+            self._stack[-1].children.append(phase)
+        else:
+            self.phases.append(phase)
+        self._stack.append(phase)
+
+    def pop(self):
+        self._stack.pop().end = time.perf_counter()
+
+    def format_table(self):
+        """Return the timings as an indented table."""
+        rows = []
+
+        def add_rows(phases, level):
+            for phase in phases:
+                rows.append(("  " * level + phase.name, phase.duration))
+                add_rows(phase.children, level + 1)
+
+        add_rows(self.phases, 0)
+        width = max([len(name) for name, __ in rows] + [len("Startup phase")]) + 2
+        lines = ["{:<{width}}{:>12}".format("Startup phase", "Time (ms)", width=width)]
+        lines.extend("{:<{width}}{:>12.1f}".format(name, duration, width=width) for name, duration in rows)
+        return "\n".join(lines)
+
+    def report(self):
+        """Print (or write to the JSON file) the timings collected so far, only once."""
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        if self.output:
+            with open(self.output, "w") as output:
+                json.dump([phase.as_dict() for phase in self.phases], output, indent=2)
+        else:
+            print(self.format_table(), file=sys.stderr)
+
+
+#: Global startup profiler
+profiler = StartupProfiler()
+
+
+class startup_phase(contextlib.ContextDecorator):  # noqa: N801
+    """
+    Context manager / decorator to record the duration of a startup phase if ``--profile-startup`` is enabled.
+
+    :param name: phase name
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.active = False
+
+    def _recreate_cm(self):
+        return self.__class__(self.name)
+
+    def __enter__(self):
+        self.active = profiler.enabled and not profiler.reported
+        if self.active:
+            profiler.push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.active:
+            profiler.pop()
+        return False
+
+
+@contextlib.contextmanager
+def profile_app_configs():
+    """Record the import of the modules and the ``ready()`` method of each application during ``django.setup``."""
+    from django.apps import AppConfig
+
+    if not profiler.enabled or profiler.reported:
+        yield
+        return
+    create = AppConfig.create.__func__
+
+    def profiled_create(cls, entry):
+        with startup_phase("import {}".format(entry)):
+            app_config = create(cls, entry)
+        app_config.import_models = startup_phase("import {}.models".format(entry))(app_config.import_models)
+        app_config.ready = startup_phase("{}.ready()".format(app_config.label))(app_config.ready)
+        return app_config
+
+    AppConfig.create = classmethod(profiled_create)
+    try:
+        yield
+    finally:
+        AppConfig.create = classmethod(create)
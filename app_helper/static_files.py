@@ -0,0 +1,232 @@
+import mimetypes
+import os
+import posixpath
+import stat
+import threading
+from collections import namedtuple
+
+from django.dispatch import receiver
+from django.utils.autoreload import file_changed
+
+#: Patterns of the static files which are not indexed, as ignored by ``collectstatic`` by default
+IGNORE_PATTERNS = ["CVS", ".*", "*~"]
+
+#: File indexes, by document root (``None`` for the static files)
+_indexes = {}
+
+#: Indexed file: filesystem path, size, modification time (in seconds and nanoseconds), ETag, content type and encoding
+FileEntry = namedtuple("FileEntry", ["path", "size", "mtime", "mtime_ns", "etag", "content_type", "encoding"])
+
+
+def _normalize(name):
+    return posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+
+
+def file_entry(path):
+    """
+    Return the index entry of the file.
+
+    :param path: filesystem path
+    :return: :py:class:`FileEntry` instance, ``None`` if the path does not exist or it's not a regular file
+    """
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None
+    content_type, encoding = mimetypes.guess_type(path)
+    return FileEntry(
+        path,
+        stat_result.st_size,
+        stat_result.st_mtime,
+        stat_result.st_mtime_ns,
+        '"{:x}-{:x}"'.format(stat_result.st_mtime_ns, stat_result.st_size),
+        content_type or "application/octet-stream",
+        encoding,
+    )
+
+
+class FileIndex:
+    """
+    Index of the files served by :py:func:`serve`.
+
+    Files are listed and their metadata computed on first lookup; files which are not in the index (e.g.: uploaded
+    media files) are looked up on the filesystem and added to it.
+    Indexed files are checked by ``os.stat`` on each lookup, and their entry is updated if they have changed, thus the
+    index is reliable without the autoreloader (e.g.: with ``--no-reload`` or ``--workers``).
+    The index is dropped by :py:meth:`invalidate` (e.g.: by the autoreloader, when any of the indexed directories
+    changes).
+
+    :param root: directory of the files, ``None`` for the files found by the staticfiles finders
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root) if root else None
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def roots(self):
+        """
+        Return the indexed directories, as configured: the document root, or the staticfiles finders locations.
+
+        :return: list of absolute paths
+        """
+        if self.root:
+            return [self.root]
+        from django.contrib.staticfiles import finders
+
+        roots = []
+        for finder in finders.get_finders():
+            for storage in getattr(finder, "storages", {}).values():
+                location = getattr(storage, "location", None)
+                if location:
+                    roots.append(os.path.abspath(location))
+        return roots
+
+    def _files(self):
+        """Yield the (name, filesystem path) of the indexed files."""
+        if self.root:
+            for directory, __, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    yield _normalize(os.path.relpath(path, self.root)), path
+            return
+        from django.contrib.staticfiles import finders
+
+        for finder in finders.get_finders():
+            for name, storage in finder.list(IGNORE_PATTERNS):
+                url_name = os.path.join(storage.prefix, name) if getattr(storage, "prefix", None) else name
+                yield _normalize(url_name), storage.path(name)
+
+    def _find(self, name):
+        """Look up the file on the filesystem."""
+        if self.root:
+            from django.utils._os import safe_join
+
+            return safe_join(self.root, name)
+        from django.contrib.staticfiles import finders
+
+        return finders.find(name)
+
+    def _build(self):
+        entries = {}
+        for name, path in self._files():
+            if name not in entries:
+                entry = file_entry(path)
+                if entry:
+                    entries[name] = entry
+        return entries
+
+    def get(self, name):
+        """
+        Return the entry of the file with the given name.
+
+        :param name: file path, relative to the document root
+        :return: :py:class:`FileEntry` instance, ``None`` if the file does not exist
+        """
+        name = _normalize(name)
+        entries = self._entries
+        if entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._build()
+                entries = self._entries
+        entry = entries.get(name)
+        if entry is not None:
+            try:
+                stat_result = os.stat(entry.path)
+            except OSError:
+                stat_result = None
+            if stat_result and (stat_result.st_mtime_ns, stat_result.st_size) == (entry.mtime_ns, entry.size):
+                return entry
+            entries.pop(name, None)
+        path = self._find(name)
+        entry = file_entry(path) if path else None
+        if entry:
+            entries[name] = entry
+        return entry
+
+    def covers(self, path):
+        """Check if the path is within any of the indexed directories, whether the index is built or not."""
+        path = os.path.abspath(path)
+        return any(path == root or path.startswith(root + os.sep) for root in self.roots())
+
+    def invalidate(self):
+        """Drop the index, which is built again on next lookup."""
+        self._entries = None
+
+
+def get_index(document_root=None):
+    """
+    Return the index of the given document root.
+
+    :param document_root: directory of the files, ``None`` for the static files
+    :return: :py:class:`FileIndex` instance
+    """
+    if document_root not in _indexes:
+        _indexes[document_root] = FileIndex(document_root)
+    return _indexes[document_root]
+
+
+def serve(request, path, document_root=None, show_indexes=False):
+    """
+    Serve the files in the document root, or the static files, from their :py:class:`FileIndex`.
+
+    Drop-in replacement of ``django.views.static.serve``: conditional requests are answered with ``304 Not Modified``
+    responses, and files are streamed by ``FileResponse``, thus by ``wsgi.file_wrapper`` if the server supports it.
+
+    :param request: request
+    :param path: file path, relative to the document root
+    :param document_root: directory of the files, ``None`` to serve the files found by the staticfiles finders
+    :param show_indexes: list the directories content
+    """
+    from django.http import FileResponse, Http404
+    from django.utils.cache import get_conditional_response
+    from django.utils.http import http_date
+
+    entry = get_index(document_root).get(path)
+    if entry is None:
+        if show_indexes and document_root:
+            from django.views.static import serve as static_serve
+
+            return static_serve(request, path, document_root, show_indexes=True)
+        raise Http404("“{}” does not exist".format(path))
+    last_modified = http_date(entry.mtime)
+    response = get_conditional_response(request, etag=entry.etag, last_modified=int(entry.mtime))
+    if response is None:
+        try:
+            handle = open(entry.path, "rb")
+        except OSError:
+            get_index(document_root).invalidate()
+            raise Http404("“{}” does not exist".format(path))
+        response = FileResponse(handle, content_type=entry.content_type)
+        if entry.encoding:
+            response["Content-Encoding"] = entry.encoding
+    response["Last-Modified"] = last_modified
+    response["ETag"] = entry.etag
+    return response
+
+
+@receiver(file_changed, dispatch_uid="app_helper_static_files_changed")
+def files_changed(sender, file_path, **kwargs):
+    """
+    Invalidate the indexes of the changed files directories.
+
+    Connected to the autoreloader ``file_changed`` signal: changes to the indexed files do not restart the server,
+    even before the index is first used.
+    """
+    from django.conf import settings
+
+    if str(file_path).endswith(".py"):
+        return False
+    # indexes of the files served by app_helper.urls
+    get_index()
+    if getattr(settings, "MEDIA_ROOT", None):
+        get_index(settings.MEDIA_ROOT)
+    changed = False
+    for index in _indexes.values():
+        if index.covers(str(file_path)):
+            index.invalidate()
+            changed = True
+    return changed
@@ -0,0 +1,318 @@
+import ast
+import os
+import subprocess
+from importlib.util import find_spec
+
+#: Files which affect the whole test suite when changed
+GLOBAL_FILES = (
+    "setup.py",
+    "setup.cfg",
+    "pyproject.toml",
+    "tox.ini",
+    "pytest.ini",
+    "conftest.py",
+    "requirements.txt",
+    "requirements-test.txt",
+)
+#: Directories which are not scanned for python modules
+EXCLUDED_DIRS = ("node_modules", "site-packages", "build", "dist", "docs", "data")
+
+
+def get_changed_files(ref, root):
+    """
+    Return the files changed (including the untracked ones) since the given git reference.
+
+    :param ref: git reference
+    :param root: project root directory
+    :return: set of absolute paths or ``None`` if git is not available
+    """
+    commands = (
+        ["git", "diff", "--name-only", "--relative", ref, "--"],
+        ["git", "ls-files", "--others", "--exclude-standard"],
+    )
+    changed = set()
+    for command in commands:
+        try:
+            output = subprocess.check_output(command, cwd=root, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        changed.update(
+            os.path.abspath(os.path.join(root, line)) for line in output.decode("utf-8").splitlines() if line
+        )
+    return changed
+
+
+def _iter_files(root, suffix=""):
+    """Walk the project directory skipping hidden and excluded directories."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith((".", "__")) and name not in EXCLUDED_DIRS]
+        for filename in filenames:
+            if filename.endswith(suffix):
+                yield os.path.join(dirpath, filename)
+
+
+class ImportGraph:
+    """Static import graph of the python modules in the project directory."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._deps = {}
+        self._modules = {}
+        #: Local modules which cannot be found on the filesystem
+        self._unresolved = set()
+        #: Files importing modules in :py:attr:`_unresolved`
+        self.broken = set()
+
+    def _is_local(self, path):
+        return bool(path) and os.path.abspath(path).startswith(self.root + os.sep)
+
+    def module_files(self, name):
+        """
+        Return the local files loaded when importing the given module: the module itself and its parent packages.
+
+        :param name: dotted module name
+        :return: list of paths (empty if the module is not part of the project)
+        """
+        if name in self._modules:
+            return self._modules[name]
+        files = []
+        parts = name.split(".")
+        try:
+            spec = find_spec(parts[0])
+        except (ImportError, ValueError):
+            spec = None
+        if spec and spec.submodule_search_locations:
+            paths = [path for path in spec.submodule_search_locations if self._is_local(path)]
+            if paths:
+                files.append(os.path.join(paths[0], "__init__.py"))
+            for part in parts[1:]:
+                packages = [os.path.join(path, part) for path in paths if os.path.isdir(os.path.join(path, part))]
+                modules = [
+                    os.path.join(path, part + ".py")
+                    for path in paths
+                    if os.path.isfile(os.path.join(path, part + ".py"))
+                ]
+                if packages:
+                    paths = packages[:1]
+                    files.append(os.path.join(paths[0], "__init__.py"))
+                else:
+                    if not modules:
+                        self._unresolved.add(name)
+                    files.extend(modules[:1])
+                    break
+        elif spec and self._is_local(spec.origin) and len(parts) == 1:
+            files.append(spec.origin)
+        self._modules[name] = [path for path in files if os.path.exists(path)]
+        return self._modules[name]
+
+    def _package(self, path):
+        """Dotted name of the package containing the given file, relative to the project root."""
+        directory = os.path.dirname(os.path.relpath(path, self.root))
+        return directory.replace(os.sep, ".") if directory else ""
+
+    def dependencies(self, path):
+        """
+        Return the local files directly imported by the given python file.
+
+        :param path: python file path
+        :return: set of paths
+        """
+        if path in self._deps:
+            return self._deps[path]
+        deps = set()
+        try:
+            with open(path, "rb") as source:
+                tree = ast.parse(source.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            tree = None
+        for node in ast.walk(tree) if tree else ():
+            names = modules = []
+            if isinstance(node, ast.Import):
+                names = modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom):
+                module = node.module or ""
+                if node.level:
+                    package = self._package(path).split(".") if self._package(path) else []
+                    package = package[: len(package) - node.level + 1]
+                    module = ".".join(part for part in package + [module] if part)
+                # imported names can be either modules or attributes of the module
+                names = [module] + ["{}.{}".format(module, alias.name) for alias in node.names]
+                modules = [module]
+            for name in names:
+                if name:
+                    deps.update(self.module_files(name))
+            # imported names can be attributes, but imported modules must exist
+            if self._unresolved.intersection(modules):
+                self.broken.add(path)
+        deps.discard(path)
+        self._deps[path] = deps
+        return deps
+
+    def closure(self, path):
+        """
+        Return all the local files the given python file depends on, transitively.
+
+        :param path: python file path
+        :return: set of paths (including the file itself)
+        """
+        seen = {path}
+        queue = [path]
+        while queue:
+            for dependency in self.dependencies(queue.pop()):
+                if dependency not in seen:
+                    seen.add(dependency)
+                    queue.append(dependency)
+        return seen
+
+
+def _referencing_files(path, root, application_dirs):
+    """
+    Return the python files which reference a non-python file (e.g.: template, fixture) by its name.
+
+    Templates are looked up by their name relative to the ``templates`` directory, other files by their basename.
+    """
+    parts = path.split(os.sep)
+    if "templates" in parts:
+        reference = "/".join(parts[len(parts) - parts[::-1].index("templates") :])
+    else:
+        reference = os.path.basename(path)
+    referencing = set()
+    for directory in application_dirs:
+        for python_file in _iter_files(directory, ".py"):
+            with open(python_file, encoding="utf-8", errors="replace") as source:
+                if reference in source.read():
+                    referencing.add(python_file)
+    return referencing
+
+
+def _label_to_module(label, root):
+    """
+    Convert a test label to a module name and a directory (or file) to look for tests in.
+
+    :return: (module name, path) or (None, None) if label is not a module or a package
+    """
+    label_path = os.path.abspath(os.path.join(root, label))
+    if os.path.isdir(label_path):
+        return os.path.relpath(label_path, root).replace(os.sep, "."), label_path
+    try:
+        spec = find_spec(label)
+    except (ImportError, ValueError, AttributeError):
+        return None, None
+    if not spec:
+        return None, None
+    if spec.submodule_search_locations:
+        return label, list(spec.submodule_search_locations)[0]
+    return label, spec.origin
+
+
+class _FullSuite(Exception):
+    """Raised when changes cannot be mapped to the test modules, with the reason as message."""
+
+
+def _get_candidates(test_labels, root):
+    """
+    Map the test labels to the test modules they contain.
+
+    :return: (test modules dotted names by path, directories containing the test modules)
+    """
+    test_dirs = []
+    candidates = {}
+    for label in test_labels or ["."]:
+        module, path = _label_to_module(label, root)
+        if not module or not path:
+            raise _FullSuite("test label {} is not a module".format(label))
+        if os.path.isdir(path):
+            test_dirs.append(path)
+            for test_file in _iter_files(path, ".py"):
+                if os.path.basename(test_file).startswith("test"):
+                    relative = os.path.splitext(os.path.relpath(test_file, path))[0].replace(os.sep, ".")
+                    candidates[test_file] = ".".join(part for part in (module, relative) if part and part != ".")
+        else:
+            candidates[path] = module
+    return candidates, test_dirs
+
+
+def _get_changed_modules(changed, root, source_dirs):
+    """
+    Map the changed files to the python files they affect.
+
+    :param changed: changed files paths
+    :param root: project root
+    :param source_dirs: directories whose non-python files are mapped to the python files referencing them
+    :return: set of python files paths
+    """
+    changed_python = set()
+    for path in changed:
+        relative = os.path.relpath(path, root)
+        if os.path.basename(path) in GLOBAL_FILES or "migrations" in relative.split(os.sep):
+            raise _FullSuite("{} changed".format(relative))
+        if path.endswith(".py"):
+            if os.path.dirname(relative) == "":
+                # top level modules are helper / settings files
+                raise _FullSuite("{} changed".format(relative))
+            if not os.path.exists(path):
+                # importers of deleted or renamed modules cannot be found anymore
+                raise _FullSuite("{} has been removed".format(relative))
+            changed_python.add(path)
+        elif any(path.startswith(directory + os.sep) for directory in source_dirs):
+            referencing = _referencing_files(path, root, source_dirs)
+            if not referencing:
+                raise _FullSuite("cannot find the modules using {}".format(relative))
+            changed_python.update(referencing)
+    return changed_python
+
+
+def _get_affected(candidates, changed_python, graph, root, pytest):
+    """
+    Return the labels of the test modules importing (directly or not) any of the changed python files.
+
+    :return: list of test labels
+    """
+    selected = [
+        test_file if pytest else module
+        for test_file, module in sorted(candidates.items())
+        if graph.closure(test_file) & changed_python
+    ]
+    if graph.broken:
+        raise _FullSuite("cannot resolve the imports of {}".format(os.path.relpath(sorted(graph.broken)[0], root)))
+    if changed_python and not selected:
+        raise _FullSuite("cannot find the test modules affected by the changes")
+    return selected
+
+
+def select_test_labels(test_labels, application, ref, root=None, pytest=False, verbose=True):
+    """
+    Restrict the test labels to the test modules affected by the changes since the given git reference.
+
+    Test modules are selected if they import (directly or not) any changed module; non-python files (templates,
+    fixtures, ...) are mapped to the modules which reference them by name.
+
+    The whole suite must be run if any global file (helper file, settings, packaging files, migrations, ...) has
+    changed or if changes cannot be mapped to the test modules.
+
+    :param test_labels: list of test labels
+    :param application: application name
+    :param ref: git reference
+    :param root: project root (default to current directory)
+    :param pytest: return files paths instead of dotted module names
+    :param verbose: print selection details
+    :return: list of test labels, or ``None`` if the whole suite must be run (it's never empty if python files have
+             changed)
+    """
+    root = os.path.abspath(root or os.getcwd())
+    try:
+        changed = get_changed_files(ref, root)
+        if changed is None:
+            raise _FullSuite("cannot compute changes since {}".format(ref))
+        graph = ImportGraph(root)
+        application_dirs = [os.path.dirname(path) for path in graph.module_files(application)[:1]]
+        candidates, test_dirs = _get_candidates(test_labels, root)
+        changed_python = _get_changed_modules(changed, root, application_dirs + test_dirs)
+        selected = _get_affected(candidates, changed_python, graph, root, pytest)
+    except _FullSuite as reason:
+        if verbose:
+            print("Running the whole test suite: {}".format(reason))
+        return None
+    if verbose:
+        print("Running {} test modules affected by changes since {}".format(len(selected), ref))
+    return selected
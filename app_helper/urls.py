@@ -1,14 +1,16 @@
 from django.conf import settings
 from django.conf.urls.i18n import i18n_patterns
+from django.conf.urls.static import static
 from django.contrib import admin
-from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import include, path, re_path
 from django.views.i18n import JavaScriptCatalog
-from django.views.static import serve
 
+from .startup_profile import startup_phase
+from .static_files import serve
 from .utils import load_from_file
 
-admin.autodiscover()
+with startup_phase("admin.autodiscover"):
+    admin.autodiscover()
 
 urlpatterns = [
     re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT, "show_indexes": True}),  # NOQA
@@ -29,5 +31,13 @@ except OSError:  # pragma: no cover
 if settings.USE_CMS:
     i18n_urls.append(path("", include("cms.urls")))  # NOQA
 
+if getattr(settings, "APP_HELPER_PROFILE_DIR", None):
+    from .request_profile import PROFILE_URL, profiles_index
+
+    urlpatterns += [
+        path(PROFILE_URL, profiles_index),
+        re_path(r"^%s(?P<path>.+)$" % PROFILE_URL, serve, {"document_root": settings.APP_HELPER_PROFILE_DIR}),
+    ]
+
 urlpatterns += i18n_patterns(*i18n_urls)
-urlpatterns += staticfiles_urlpatterns()
+urlpatterns += static(settings.STATIC_URL, view=serve)
@@ -1,4 +1,5 @@
 import contextlib
+import functools
 import os
 import random
 import shutil
@@ -12,59 +13,145 @@ import six
 from django.core.management import call_command
 from django.urls import clear_url_caches
 from django.utils.functional import empty
-from packaging import version
 
 from . import HELPER_FILE
+from .startup_profile import profile_app_configs, startup_phase
+
+#: Version flags: each one is ``True`` if the installed version is within the given ``[lower, upper)`` bounds
+CMS_FLAGS = {
+    "CMS_42": ("4.2", "4.3"),
+    "CMS_41": ("4.1", "4.2"),
+    "CMS_40": ("4.0", "4.1"),
+    "CMS_311": ("3.11", "4.0"),
+    "CMS_310": ("3.10", "3.11"),
+    "CMS_39": ("3.9", "3.10"),
+    "CMS_38": ("3.8", "3.9"),
+    "CMS_37": ("3.7", "3.8"),
+    "CMS_36": ("3.6", "3.7"),
+    "CMS_35": ("3.5", "3.6"),
+    "CMS_34": ("3.4", "3.5"),
+    "CMS_33": ("3.3", "3.4"),
+    "CMS_32": ("3.2", "3.3"),
+    "CMS_31": ("3.1", "3.2"),
+    "CMS_30": ("3.0", "3.1"),
+}
+DJANGO_FLAGS = {
+    "DJANGO_2_2": ("2.2", "3.0"),
+    "DJANGO_3_0": ("3.0", "3.1"),
+    "DJANGO_3_1": ("3.1", "3.2"),
+    "DJANGO_3_2": ("3.2", "4.0"),
+    "DJANGO_4_0": ("4.0", "4.1"),
+    "DJANGO_4_1": ("4.1", "4.2"),
+    "DJANGO_4_2": ("4.2", "5.0"),
+    "DJANGO_5_0": ("5.0", "5.1"),
+    "DJANGO_5_1": ("5.1", "5.2"),
+    "DJANGO_5_2": ("5.2", "6.0"),
+}
+
+#: Password hashes computed by :py:func:`get_password_hash`, by hasher class path and password
+_password_hashes = {}
+
+
+def _version_tuple(value):
+    """
+    Convert a version string to a tuple of integers, ignoring any pre / post release suffix.
+
+    ``"3.11.0rc1"`` is converted to ``(3, 11, 0)``.
+    """
+    numbers = []
+    for part in str(value).split("."):
+        digits = ""
+        for char in part:
+            if not char.isdigit():
+                break
+            digits += char
+        if not digits:
+            break
+        numbers.append(int(digits))
+        if len(digits) < len(part):
+            break
+    return tuple(numbers)
+
+
+@functools.lru_cache(maxsize=None)
+def get_cms_version():
+    """
+    Return the installed django CMS version.
+
+    :return: version tuple or ``None`` if django CMS is not installed
+    """
+    try:
+        import cms
+    except ImportError:  # pragma: no cover
+        return None
+    return _version_tuple(cms.__version__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_django_version():
+    """
+    Return the installed Django version.
+
+    :return: version tuple
+    """
+    return tuple(django.VERSION[:3])
+
+
+def _version_between(current, lower, upper):
+    if current is None:
+        return False
+    if lower is not None and current < _version_tuple(lower):
+        return False
+    if upper is not None and current >= _version_tuple(upper):
+        return False
+    return True
 
-try:
-    import cms  # NOQA
-
-    CMS = True
-    CMS_42 = version.parse("4.2") <= version.parse(cms.__version__) < version.parse("4.3")
-    CMS_41 = version.parse("4.1") <= version.parse(cms.__version__) < version.parse("4.2")
-    CMS_40 = version.parse("4.0") <= version.parse(cms.__version__) < version.parse("4.1")
-    CMS_311 = version.parse("3.11") <= version.parse(cms.__version__) < version.parse("4.0")
-    CMS_310 = version.parse("3.10") <= version.parse(cms.__version__) < version.parse("3.11")
-    CMS_39 = version.parse("3.9") <= version.parse(cms.__version__) < version.parse("3.10")
-    CMS_38 = version.parse("3.8") <= version.parse(cms.__version__) < version.parse("3.9")
-    CMS_37 = version.parse("3.7") <= version.parse(cms.__version__) < version.parse("3.8")
-    CMS_36 = version.parse("3.6") <= version.parse(cms.__version__) < version.parse("3.7")
-    CMS_35 = version.parse("3.5") <= version.parse(cms.__version__) < version.parse("3.6")
-    CMS_34 = version.parse("3.4") <= version.parse(cms.__version__) < version.parse("3.5")
-    CMS_33 = version.parse("3.3") <= version.parse(cms.__version__) < version.parse("3.4")
-    CMS_32 = version.parse("3.2") <= version.parse(cms.__version__) < version.parse("3.3")
-    CMS_31 = version.parse("3.1") <= version.parse(cms.__version__) < version.parse("3.2")
-    CMS_30 = version.parse("3.0") <= version.parse(cms.__version__) < version.parse("3.1")
-except ImportError:  # pragma: no cover
-    CMS = False
-    CMS_42 = False
-    CMS_41 = False
-    CMS_40 = False
-    CMS_311 = False
-    CMS_310 = False
-    CMS_39 = False
-    CMS_38 = False
-    CMS_37 = False
-    CMS_36 = False
-    CMS_35 = False
-    CMS_34 = False
-    CMS_33 = False
-    CMS_32 = False
-    CMS_31 = False
-    CMS_30 = False
-
-DJANGO_2_2 = version.parse("2.2") <= version.parse(django.get_version()) < version.parse("3.0")
-DJANGO_3_0 = version.parse("3.0") <= version.parse(django.get_version()) < version.parse("3.1")
-DJANGO_3_1 = version.parse("3.1") <= version.parse(django.get_version()) < version.parse("3.2")
-DJANGO_3_2 = version.parse("3.2") <= version.parse(django.get_version()) < version.parse("4.0")
-DJANGO_4_0 = version.parse("4.0") <= version.parse(django.get_version()) < version.parse("4.1")
-DJANGO_4_1 = version.parse("4.1") <= version.parse(django.get_version()) < version.parse("4.2")
-DJANGO_4_2 = version.parse("4.2") <= version.parse(django.get_version()) < version.parse("5.0")
-DJANGO_5_0 = version.parse("5.0") <= version.parse(django.get_version()) < version.parse("5.1")
-DJANGO_5_1 = version.parse("5.1") <= version.parse(django.get_version()) < version.parse("5.2")
-DJANGO_5_2 = version.parse("5.2") <= version.parse(django.get_version()) < version.parse("6.0")
+
+def cms_version_between(lower=None, upper=None):
+    """
+    Check the installed django CMS version.
+
+    Pre-releases are considered part of their release (e.g.: ``4.1.0rc1`` is between ``4.1`` and ``4.2``).
+
+    :param lower: minimum version (included), or ``None`` for no lower bound
+    :param upper: maximum version (excluded), or ``None`` for no upper bound
+    :return: ``True`` if django CMS is installed and its version is in the given range
+    """
+    return _version_between(get_cms_version(), lower, upper)
 
 
+def django_version_between(lower=None, upper=None):
+    """
+    Check the installed Django version.
+
+    :param lower: minimum version (included), or ``None`` for no lower bound
+    :param upper: maximum version (excluded), or ``None`` for no upper bound
+    :return: ``True`` if Django version is in the given range
+    """
+    return _version_between(get_django_version(), lower, upper)
+
+
+def __getattr__(name):
+    """
+    Compute the ``CMS`` and version flags (:py:data:`CMS_FLAGS`, :py:data:`DJANGO_FLAGS`) on first access.
+    """
+    if name == "CMS":
+        value = get_cms_version() is not None
+    elif name in CMS_FLAGS:
+        value = cms_version_between(*CMS_FLAGS[name])
+    elif name in DJANGO_FLAGS:
+        value = django_version_between(*DJANGO_FLAGS[name])
+    else:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | {"CMS"} | set(CMS_FLAGS) | set(DJANGO_FLAGS))
+
+
+@startup_phase("load_from_file")
 def load_from_file(module_path):
     """
     Load a python module from its absolute filesystem path
@@ -141,6 +228,7 @@ class DisableMigrations:
         return None
 
 
+@startup_phase("_reset_django")
 def _reset_django(settings):
     """
     Hackish way to reset the django instance settings and AppConfig
@@ -155,9 +243,26 @@ def _reset_django(settings):
         clear_url_caches()
 
 
+def _get_extra_settings_file(args):
+    """Return the path of the helper file providing the extra settings."""
+    extra_settings_file = args.get("--extra-settings")
+    if not extra_settings_file:
+        extra_settings_file = HELPER_FILE
+    if extra_settings_file[-3:] != ".py":  # pragma: no cover
+        filename, __ = os.path.splitext(extra_settings_file)
+        extra_settings_file = "{}.py".format(filename)
+    return extra_settings_file
+
+
+@startup_phase("_make_settings")
 def _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT):  # NOQA
     """
     Setup the Django settings
+
+    If the ``APP_HELPER_SETTINGS_CACHE`` environment variable is set, generated settings are cached (see
+    :py:mod:`app_helper.settings_cache`) and reused as long as the helper file, the command line arguments and the
+    environment are unchanged.
+
     :param args: docopt arguments
     :param application: application module name
     :param settings: Django settings module
@@ -165,30 +270,63 @@ def _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT):  # NOQ
     :param MEDIA_ROOT: media root directory
     :return:
     """
+    from .settings_cache import get_cached_settings, resolve_placeholders, set_cached_settings, settings_cache_key
+
+    extra_settings_file = _get_extra_settings_file(args)
+    cache_key = settings_cache_key(args, application, extra_settings_file)
+    default_settings = get_cached_settings(cache_key)
+    if default_settings is None:
+        default_settings = _build_settings(args, application, extra_settings_file)
+        set_cached_settings(cache_key, default_settings)
+    resolve_placeholders(default_settings, STATIC_ROOT=STATIC_ROOT, MEDIA_ROOT=MEDIA_ROOT)
+
+    _reset_django(settings)
+    settings.configure(**default_settings)
+    with startup_phase("django.setup"), profile_app_configs():
+        django.setup()
+    reload_urls(settings, cms_apps=False)
+    return settings
+
+
+def _build_settings(args, application, extra_settings_file):  # NOQA
+    """
+    Build the settings dictionary merging the default settings and the helper file ones.
+
+    ``STATIC_ROOT`` and ``MEDIA_ROOT`` defaults are set as :py:class:`app_helper.settings_cache.Placeholder`.
+
+    :param args: docopt arguments
+    :param application: application module name
+    :param extra_settings_file: path of the helper file
+    :return: settings dictionary
+    """
     import dj_database_url
 
     from .default_settings import get_default_settings
+    from .settings_cache import Placeholder
 
     try:
-        extra_settings_file = args.get("--extra-settings")
-        if not extra_settings_file:
-            extra_settings_file = HELPER_FILE
-        if extra_settings_file[-3:] != ".py":  # pragma: no cover
-            filename, __ = os.path.splitext(extra_settings_file)
-            extra_settings_file = "{}.py".format(filename)
         extra_settings = load_from_file(extra_settings_file).HELPER_SETTINGS
     except (OSError, AttributeError):
         extra_settings = None
-    default_name = ":memory:" if args["test"] else "local.sqlite"
+    test_mode = args["test"] or args.get("serve-tests", False)
+    default_name = ":memory:" if test_mode else "local.sqlite"
     db_url = os.environ.get("DATABASE_URL", "sqlite://localhost/%s" % default_name)
     configs = {
         "DATABASES": {"default": dj_database_url.parse(db_url)},
-        "STATIC_ROOT": STATIC_ROOT,
-        "MEDIA_ROOT": MEDIA_ROOT,
+        "STATIC_ROOT": Placeholder("STATIC_ROOT"),
+        "MEDIA_ROOT": Placeholder("MEDIA_ROOT"),
         "USE_TZ": True,
         "USE_CMS": args["--cms"],
         "BASE_APPLICATION": application,
     }
+    if args.get("--migrations-cache"):
+        configs["APP_HELPER_MIGRATIONS_CACHE"] = os.path.abspath(args["--migrations-cache"])
+    if args.get("--watch"):
+        configs["APP_HELPER_WATCH_PATHS"] = [os.path.abspath(path) for path in args["--watch"].split(",") if path]
+    if args.get("--reload-debounce"):
+        configs["APP_HELPER_RELOAD_DEBOUNCE"] = float(args["--reload-debounce"])
+    if args.get("--profile"):
+        configs["APP_HELPER_PROFILE_DIR"] = os.path.abspath(args["--profile"])
 
     if configs["USE_CMS"] or getattr(extra_settings, "USE_CMS", False):
         CMS_APPS = [  # NOQA
@@ -290,8 +428,8 @@ def _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT):  # NOQ
             )
         default_settings["AUTH_USER_MODEL"] = custom_user_model
 
-    if args["test"]:
-        default_settings["SESSION_ENGINE"] = "django.contrib.sessions.backends.cache"
+    if test_mode:
+        default_settings["SESSION_ENGINE"] = "app_helper.sessions"
     if application not in default_settings["INSTALLED_APPS"]:
         default_settings["INSTALLED_APPS"].append(application)
 
@@ -301,17 +439,17 @@ def _make_settings(args, application, settings, STATIC_ROOT, MEDIA_ROOT):  # NOQ
     if "MIDDLEWARE" not in default_settings:
         default_settings["MIDDLEWARE"] = default_settings["MIDDLEWARE_CLASSES"]
         del default_settings["MIDDLEWARE_CLASSES"]
+    if args["server"] and default_settings.get("APP_HELPER_PROFILE_DIR"):
+        default_settings["MIDDLEWARE"] = ["app_helper.request_profile.ProfilingMiddleware"] + list(
+            default_settings["MIDDLEWARE"]
+        )
     if not default_settings.get("SECRET_KEY", None):
         default_settings["SECRET_KEY"] = "".join(random.choice(string.ascii_lowercase) for i in range(32))
     default_settings["DEFAULT_AUTO_FIELD"] = "django.db.models.BigAutoField"
-
-    _reset_django(settings)
-    settings.configure(**default_settings)
-    django.setup()
-    reload_urls(settings, cms_apps=False)
-    return settings
+    return default_settings
 
 
+@startup_phase("reload_urls")
 def reload_urls(settings, urlconf=None, cms_apps=True):
     if "cms.urls" in sys.modules:
         six.moves.reload_module(sys.modules["cms.urls"])
@@ -327,8 +465,14 @@ def reload_urls(settings, urlconf=None, cms_apps=True):
         get_app_patterns()
 
 
+@startup_phase("_create_db")
 def _create_db(migrate_cmd=False):
-    call_command("migrate")
+    from django.conf import settings
+
+    from .migrations_cache import migrations_snapshot
+
+    with migrations_snapshot(getattr(settings, "APP_HELPER_MIGRATIONS_CACHE", None)):
+        call_command("migrate")
 
 
 def get_user_model():
@@ -337,6 +481,26 @@ def get_user_model():
     return get_user_model()
 
 
+def get_password_hash(password):
+    """
+    Return the hash of the password computed by the default password hasher.
+
+    Hashes are memoized by hasher and password, thus users created with the same password share the same salt.
+
+    :param password: raw password; ``None`` generates an unusable password, which is not memoized
+    :return: password hash
+    """
+    from django.contrib.auth.hashers import get_hasher, make_password
+
+    if password is None:
+        return make_password(password)
+    hasher = get_hasher()
+    key = ("{}.{}".format(hasher.__class__.__module__, hasher.__class__.__qualname__), password)
+    if key not in _password_hashes:
+        _password_hashes[key] = make_password(password, hasher=hasher)
+    return _password_hashes[key]
+
+
 def create_user(
     username,
     email,
@@ -365,7 +529,7 @@ def create_user(
         user.email = email
     except AttributeError:
         pass
-    user.set_password(password)
+    user.password = get_password_hash(password)
     if is_superuser:
         user.is_superuser = True
     if is_superuser or is_staff:
@@ -387,6 +551,40 @@ def create_user(
     return user
 
 
+def bulk_create_users(users_data):
+    """
+    Create users with a single ``bulk_create`` query, replacing any existing user with the same username.
+
+    Password hashes are computed by :py:func:`get_password_hash`.
+
+    :param users_data: list of dictionaries with ``username``, ``email``, ``password``, ``is_staff`` and
+                       ``is_superuser`` keys
+    :return: list of users, in the same order as ``users_data``
+    """
+    User = get_user_model()  # NOQA
+
+    users = []
+    for data in users_data:
+        user = User()
+        if User.USERNAME_FIELD != "email":
+            setattr(user, User.USERNAME_FIELD, data["username"])
+        try:
+            user.email = data["email"]
+        except AttributeError:
+            pass
+        user.password = get_password_hash(data["password"])
+        user.is_superuser = data.get("is_superuser", False)
+        user.is_staff = data.get("is_staff", False) or user.is_superuser
+        user.is_active = True
+        users.append(user)
+    usernames = [getattr(user, User.USERNAME_FIELD) for user in users]
+    User.objects.filter(**{"{}__in".format(User.USERNAME_FIELD): usernames}).delete()
+    User.objects.bulk_create(users)
+    # primary keys are not set by bulk_create on all the databases
+    created = User.objects.in_bulk(usernames, field_name=User.USERNAME_FIELD)
+    return [created[username] for username in usernames]
+
+
 def get_user_model_labels():
     User = get_user_model()  # NOQA
 
@@ -396,19 +594,25 @@ def get_user_model_labels():
 
 
 class UserLoginContext:
-    def __init__(self, testcase, user, password=None):
+    def __init__(self, testcase, user, password=None, authenticate=None):
         self.testcase = testcase
         self.user = user
+        if authenticate is None:
+            authenticate = password is not None
+        self.authenticate = authenticate
         if password is None:
             password = getattr(user, get_user_model().USERNAME_FIELD)
         self.password = password
 
     def __enter__(self):
-        loginok = self.testcase.client.login(
-            username=getattr(self.user, get_user_model().USERNAME_FIELD),
-            password=self.password,
-        )
-        self.testcase.assertTrue(loginok)
+        if self.authenticate:
+            loginok = self.testcase.client.login(
+                username=getattr(self.user, get_user_model().USERNAME_FIELD),
+                password=self.password,
+            )
+            self.testcase.assertTrue(loginok)
+        else:
+            self.testcase.client.force_login(self.user)
         self.testcase._login_context = self
 
     def __exit__(self, exc, value, tb):
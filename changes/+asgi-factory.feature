@@ -0,0 +1 @@
+Add app_helper.asgi.get_application factory to build the ASGI application from the helper settings
@@ -0,0 +1 @@
+Add RequestTestCaseMixin.requests to build requests for many paths and share the request factory in test classes
@@ -0,0 +1 @@
+Add bench command to measure the application throughput and latency in process
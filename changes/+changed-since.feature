@@ -0,0 +1 @@
+Add --changed-since option to run only the tests affected by changes
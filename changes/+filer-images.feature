@@ -0,0 +1 @@
+Add CreateTestDataMixin.create_filer_images to create many filer images sharing the same file in a single transaction, running the file save receivers (e.g. thumbnails generation) only once
@@ -0,0 +1 @@
+Cache the images content in create_django_image, close and delete the images files on test class teardown and add create_django_image_content to create in-memory images
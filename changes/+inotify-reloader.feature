@@ -0,0 +1 @@
+Add inotify based, application scoped autoreloader to server command
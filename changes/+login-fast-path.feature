@@ -0,0 +1 @@
+Memoize password hashes in create_user and log users in with force_login in login_user_context
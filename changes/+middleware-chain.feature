@@ -0,0 +1 @@
+Reuse the middleware instances in RequestTestCaseMixin requests until MIDDLEWARE setting changes
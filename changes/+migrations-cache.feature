@@ -0,0 +1 @@
+Add --migrations-cache option to cache migrated SQLite databases
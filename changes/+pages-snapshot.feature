@@ -0,0 +1 @@
+Add CMSPageRenderingMixin._pages_snapshot to restore pages from a database snapshot in get_pages
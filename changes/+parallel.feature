@@ -0,0 +1 @@
+Add --parallel option to test command
@@ -0,0 +1 @@
+Add --profile-startup option to report the time spent in each startup phase
@@ -0,0 +1 @@
+Add query count, query time and repeated statements budgets to BaseTestCase and report the tests executing the most queries with test --queries-summary
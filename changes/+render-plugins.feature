@@ -0,0 +1 @@
+Add CMSPageRenderingMixin.render_plugins to render many plugins sharing the request and the content renderer
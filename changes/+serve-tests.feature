@@ -0,0 +1 @@
+Add serve-tests command to run tests in a pre-configured forked process
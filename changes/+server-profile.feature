@@ -0,0 +1 @@
+Add --profile option to server command to record requests timings and save cProfile dumps of slow requests
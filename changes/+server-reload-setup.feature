@@ -0,0 +1 @@
+Skip the database setup on server autoreloader restarts if migrations and database are unchanged
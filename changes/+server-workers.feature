@@ -0,0 +1 @@
+Add --workers and --no-reload options to server command to serve the application from pre-forked processes
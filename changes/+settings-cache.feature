@@ -0,0 +1 @@
+Cache the settings generated from the helper file, if enabled by the APP_HELPER_SETTINGS_CACHE environment variable
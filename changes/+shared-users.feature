@@ -0,0 +1 @@
+Add CreateTestDataMixin._shared_users to create the standard users once per database
@@ -0,0 +1 @@
+Serve static and media files from an index of their metadata, with ETag and conditional requests support
@@ -0,0 +1 @@
+Use an in-process session engine when running tests
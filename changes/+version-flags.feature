@@ -0,0 +1 @@
+Compute version flags lazily and add cms_version_between / django_version_between helpers
@@ -8,8 +8,10 @@ from django.contrib.auth.models import AnonymousUser
 from django.http import SimpleCookie
 from django.test import Client, TestCase
 
-from app_helper.base_test import GenericHelpersMixin, RequestTestCaseMixin
-from app_helper.utils import create_user
+from app_helper.base_test import CreateTestDataMixin, GenericHelpersMixin, QueryBudgetMixin, RequestTestCaseMixin
+from app_helper.db_snapshot import ObjectsSnapshot
+from app_helper.query_budget import QueryBudget, query_budget
+from app_helper.utils import bulk_create_users, create_user, get_password_hash
 
 
 class TestRequestTestCaseMixin(TestCase):
@@ -83,6 +85,22 @@ class TestRequestTestCaseMixin(TestCase):
         request = test_instance.request("/", lang="en")
         self.assertTrue(isinstance(request.user, AnonymousUser))
 
+    def test_login_user_context_authenticate(self):
+        """login_user_context checks the password only if requested."""
+        from unittest.mock import patch
+
+        user = create_user("some", "some@testcom", "other")
+        test_instance = self.RequestTestCase()
+        with patch.object(test_instance.client, "login") as login:
+            with test_instance.login_user_context(user):
+                self.assertEqual(int(test_instance.client.session["_auth_user_id"]), user.pk)
+        login.assert_not_called()
+        with self.assertRaises(AssertionError):
+            with test_instance.login_user_context(user, authenticate=True):
+                pass
+        with test_instance.login_user_context(user, password="other"):
+            self.assertEqual(int(test_instance.client.session["_auth_user_id"]), user.pk)
+
     def test_apply_middleware(self):
         """Request with applied middlewares,"""
         test_instance = self.RequestTestCase()
@@ -99,6 +117,84 @@ class TestRequestTestCaseMixin(TestCase):
         except ImportError:
             pass
 
+    def test_requests(self):
+        """Requests for many paths share the request factory."""
+        test_instance = self.RequestTestCase()
+        user = create_user("admin", "admin@admin.com", "admin", is_staff=True, is_superuser=True)
+        requests = test_instance.requests(["/", "/en/", "/it/"], method="post", data={"a": "b"}, lang="en", user=user)
+        self.assertEqual([request.path for request in requests], ["/", "/en/", "/it/"])
+        for request in requests:
+            self.assertEqual(request.method, "POST")
+            self.assertEqual(request.POST["a"], "b")
+            self.assertEqual(request.user, user)
+            self.assertEqual(request.LANGUAGE_CODE, "en")
+        self.assertIsNot(requests[0].session, requests[1].session)
+        self.assertIs(test_instance._get_request_factory(), self.RequestTestCase._get_request_factory())
+        self.assertIsNot(test_instance._get_request_factory(), RequestTestCaseMixin._get_request_factory())
+
+    def test_middleware_chain_reuse(self):
+        """Middlewares are instantiated once until settings change."""
+        test_instance = self.RequestTestCase()
+        test_instance.request("/", lang="en", use_middlewares=True)
+        builds = RequestTestCaseMixin.middleware_chain_builds
+        chain = test_instance._get_middlewares()
+        for _i in range(3):
+            test_instance.request("/", lang="en", use_middlewares=True)
+        self.assertEqual(RequestTestCaseMixin.middleware_chain_builds, builds)
+        self.assertIs(test_instance._get_middlewares(), chain)
+
+        middleware = [path for path in settings.MIDDLEWARE if "messages" not in path]
+        with self.settings(MIDDLEWARE=middleware):
+            response = test_instance.request("/", lang="en", use_middlewares=True)
+            self.assertFalse(hasattr(response, "_messages"))
+            self.assertEqual(len(test_instance._get_middlewares()), len(middleware))
+        self.assertEqual(RequestTestCaseMixin.middleware_chain_builds, builds + 1)
+        response = test_instance.request("/", lang="en", use_middlewares=True)
+        self.assertIsNotNone(response._messages)
+        self.assertEqual(RequestTestCaseMixin.middleware_chain_builds, builds + 2)
+
+    def test_middleware_chain_settings(self):
+        """Middlewares are instantiated again when any setting changes."""
+        from django.contrib.sessions.backends import signed_cookies
+
+        test_instance = self.RequestTestCase()
+        test_instance.request("/", lang="en", use_middlewares=True)
+        with self.settings(SESSION_ENGINE="django.contrib.sessions.backends.signed_cookies"):
+            session_middleware = [
+                middleware for middleware in test_instance._get_middlewares() if hasattr(middleware, "SessionStore")
+            ]
+            self.assertIs(session_middleware[0].SessionStore, signed_cookies.SessionStore)
+            request = test_instance.request("/", lang="en", use_middlewares=True)
+            self.assertIsInstance(request.session, signed_cookies.SessionStore)
+
+    def test_sessions(self):
+        """Sessions are stored in process and cleared after each test."""
+        from unittest.mock import patch
+
+        from app_helper.sessions import SessionStore
+
+        self.assertEqual(settings.SESSION_ENGINE, "app_helper.sessions")
+        session = SessionStore()
+        session["items"] = [1]
+        session.save()
+        self.assertTrue(session.exists(session.session_key))
+        self.assertEqual(SessionStore(session.session_key)["items"], [1])
+        with self.assertRaises(KeyError):
+            SessionStore("missing")["items"]
+
+        session.set_expiry(-1)
+        session.save()
+        SessionStore.clear_expired()
+        self.assertFalse(session.exists(session.session_key))
+
+        user = create_user("admin", "admin@admin.com", "admin", is_staff=True, is_superuser=True)
+        self.client.force_login(user)
+        self.assertEqual(int(self.client.session["_auth_user_id"]), user.pk)
+        with patch.object(TestCase, "_post_teardown"):
+            self.RequestTestCase()._post_teardown()
+        self.assertFalse(session.exists(self.client.session.session_key))
+        session.delete()
+
     def test_use_toolbar(self):
         """Request with django CMS toolbar."""
         try:
@@ -128,6 +224,206 @@ class TestRequestTestCaseMixin(TestCase):
         self.assertEqual(response.current_page, page)
 
 
+class TestCreateTestDataMixin(TestCase):
+    class SharedUsers(CreateTestDataMixin):
+        _shared_users = True
+
+    def test_bulk_create_users(self):
+        users_data = [
+            {"username": "admin", "email": "admin@example.com", "password": "pass", "is_superuser": True},
+            {"username": "staff", "email": "staff@example.com", "password": "pass", "is_staff": True},
+        ]
+        with self.assertNumQueries(3):
+            bulk_create_users(users_data[:1])
+        create_user("staff", "old@example.com", "old")
+        # existing users are replaced
+        users = bulk_create_users(users_data)
+        self.assertEqual([user.username for user in users], ["admin", "staff"])
+        self.assertTrue(users[0].is_staff)
+        self.assertTrue(users[0].is_superuser)
+        self.assertTrue(users[1].is_staff)
+        self.assertFalse(users[1].is_superuser)
+        self.assertEqual(users[1].email, "staff@example.com")
+        self.assertTrue(users[1].check_password("pass"))
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+    def test_get_password_hash(self):
+        from unittest.mock import patch
+
+        password_hash = get_password_hash("pass")
+        with patch("django.contrib.auth.hashers.make_password") as make_password:
+            self.assertEqual(get_password_hash("pass"), password_hash)
+            user = create_user("some", "some@testcom", "pass")
+        make_password.assert_not_called()
+        self.assertEqual(user.password, password_hash)
+        self.assertTrue(user.check_password("pass"))
+        self.assertNotEqual(get_password_hash("other"), password_hash)
+        self.assertFalse(get_user_model()(password=get_password_hash(None)).has_usable_password())
+        with self.settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher"]):
+            self.assertTrue(get_password_hash("pass").startswith("pbkdf2_sha1$"))
+
+    def test_shared_users(self):
+        self.SharedUsers._setup_users()
+        user = self.SharedUsers.user
+        self.assertTrue(user.is_superuser)
+        self.assertTrue(self.SharedUsers.user_staff.check_password("staff"))
+        self.assertFalse(self.SharedUsers.user_normal.is_staff)
+
+        class OtherSharedUsers(self.SharedUsers):
+            pass
+
+        with self.assertNumQueries(1):
+            OtherSharedUsers._setup_users()
+        self.assertEqual(OtherSharedUsers.user, user)
+        self.assertIsNot(OtherSharedUsers.user, user)
+
+        OtherSharedUsers._teardown_users()
+        self.assertEqual(get_user_model().objects.count(), 3)
+
+        # users are created again if deleted
+        self.SharedUsers.user_normal.delete()
+        OtherSharedUsers._setup_users()
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertEqual(OtherSharedUsers.user_normal.username, "normal")
+
+    def test_create_django_image(self):
+        from unittest.mock import patch
+
+        from django.core.files import File as DjangoFile
+
+        file_obj, filename = CreateTestDataMixin.create_django_image()
+        with patch.object(CreateTestDataMixin, "create_image") as create_image:
+            other_obj, other_filename = CreateTestDataMixin.create_django_image()
+        create_image.assert_not_called()
+        self.assertIsInstance(file_obj, DjangoFile)
+        self.assertEqual(file_obj.name, "test_file.jpg")
+        self.assertEqual(file_obj.file.name, filename)
+        self.assertNotEqual(filename, other_filename)
+        self.assertEqual(file_obj.read(), other_obj.read())
+        with open(filename, "rb") as image_file:
+            self.assertEqual(image_file.read(), CreateTestDataMixin._get_image_content())
+        self.assertNotEqual(
+            CreateTestDataMixin._get_image_content(size=(10, 10)), CreateTestDataMixin._get_image_content()
+        )
+
+        CreateTestDataMixin._teardown_images()
+        self.assertTrue(file_obj.closed)
+        self.assertFalse(os.path.exists(filename))
+        self.assertFalse(os.path.exists(other_filename))
+
+    def test_create_django_image_content(self):
+        content_obj = CreateTestDataMixin.create_django_image_content("image.png", size=(10, 10), format="PNG")
+        self.assertEqual(content_obj.name, "image.png")
+        self.assertEqual(content_obj.read(), CreateTestDataMixin._get_image_content(size=(10, 10), format="PNG"))
+
+
+class TestQueryBudgetMixin(TestCase):
+    class QueryBudgetTestCase(QueryBudgetMixin, unittest.TestCase):
+        databases = {"default"}
+
+        @query_budget(queries=2, repeated=1)
+        def test_n_plus_one(self):
+            for user in get_user_model().objects.order_by("pk"):
+                list(user.groups.all())
+
+        def test_no_budget(self):
+            list(get_user_model().objects.all())
+
+    def test_query_budget(self):
+        from unittest.mock import patch
+
+        from app_helper import query_budget as query_budget_module
+        from app_helper.query_budget import collect_records
+
+        for username in ("a", "b", "c"):
+            create_user(username, "{}@example.com".format(username), username)
+        result = unittest.TestResult()
+        # inner test runs are not reported in the summary of the outer one
+        with collect_records():
+            self.QueryBudgetTestCase("test_n_plus_one").run(result)
+        self.assertEqual(len(result.failures), 1)
+        self.assertIn("Query budget exceeded: 4 queries executed, budget is 2", result.failures[0][1])
+        self.assertIn("statement executed 3 times, budget is 1 (N+1 queries?)", result.failures[0][1])
+
+        # queries of tests without budget are only recorded if the summary is requested
+        with collect_records() as records:
+            result = unittest.TestResult()
+            self.QueryBudgetTestCase("test_no_budget").run(result)
+            self.assertTrue(result.wasSuccessful())
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].count, 1)
+        self.assertTrue(records[0].test.endswith("QueryBudgetTestCase.test_no_budget"))
+        with patch.object(query_budget_module, "record_queries") as record_queries:
+            self.QueryBudgetTestCase("test_no_budget").run(unittest.TestResult())
+        record_queries.assert_not_called()
+
+        with patch.object(self.QueryBudgetTestCase, "_query_budget", QueryBudget(queries=0)):
+            result = unittest.TestResult()
+            with collect_records():
+                self.QueryBudgetTestCase("test_no_budget").run(result)
+        self.assertEqual(len(result.failures), 1)
+
+
+class TestObjectsSnapshot(TestCase):
+    def test_snapshot(self):
+        from django.contrib.auth.models import Group
+
+        User = get_user_model()  # NOQA
+        existing = create_user("existing", "existing@example.com", "existing")
+        snapshot = ObjectsSnapshot()
+        with snapshot.record():
+            group = Group.objects.create(name="group")
+            user = create_user("user", "user@example.com", "user")
+            user.groups.add(group)
+            deleted = create_user("deleted", "deleted@example.com", "deleted")
+            deleted.delete()
+            user.first_name = "Name"
+            user.save()
+        self.assertEqual(list(snapshot.rows[User]), [user.pk])
+        # rows already exist
+        self.assertFalse(snapshot.restore())
+
+        User.objects.exclude(pk=existing.pk).delete()
+        group.delete()
+        # one query to check each table, one to insert rows in each table, plus savepoint
+        with self.assertNumQueries(8):
+            self.assertTrue(snapshot.restore())
+        restored = User.objects.get(pk=user.pk)
+        self.assertEqual(restored.first_name, "Name")
+        self.assertEqual([restored_group.name for restored_group in restored.groups.all()], ["group"])
+        self.assertEqual(User.objects.count(), 2)
+        # sequences are up to date
+        self.assertGreater(create_user("new", "new@example.com", "new").pk, user.pk)
+
+    def test_snapshot_update(self):
+        from django.contrib.auth.models import Group
+
+        User = get_user_model()  # NOQA
+        existing = create_user("existing", "existing@example.com", "existing")
+        snapshot = ObjectsSnapshot()
+        with snapshot.record():
+            user = create_user("user", "user@example.com", "user")
+            User.objects.filter(pk=user.pk).update(first_name="Name")
+        # updated rows are part of the snapshot
+        self.assertTrue(snapshot.complete)
+        self.assertEqual(snapshot.rows[User][user.pk].first_name, "Name")
+
+        snapshot = ObjectsSnapshot()
+        with snapshot.record():
+            create_user("other", "other@example.com", "other")
+            User.objects.filter(pk=existing.pk).update(first_name="Changed")
+        self.assertFalse(snapshot.complete)
+        self.assertEqual(snapshot.untracked, [User])
+        User.objects.exclude(pk=existing.pk).delete()
+        self.assertFalse(snapshot.restore())
+        self.assertEqual(User.objects.count(), 1)
+
+        snapshot = ObjectsSnapshot()
+        with snapshot.record():
+            Group.objects.bulk_create([Group(name="group")])
+        self.assertEqual(snapshot.untracked, [Group])
+
+
 class TestGenericHelpersMixin(TestCase):
     class GenericHelper(GenericHelpersMixin, TestCase):
         pass
@@ -1,8 +1,12 @@
 import contextlib
+import json
 import os
 import os.path
 import shutil
+import signal
+import subprocess
 import sys
+import time
 import unittest
 from copy import copy
 from tempfile import mkdtemp
@@ -168,6 +172,7 @@ class CommandTests(unittest.TestCase):
         ]
         target_1 = {
             "--bind": "127.0.0.1",
+            "--changed-since": None,
             "--cms": True,
             "--dry-run": False,
             "--empty": False,
@@ -177,27 +182,46 @@ class CommandTests(unittest.TestCase):
             "--locale": None,
             "--merge": False,
             "--migrate": False,
+            "--migrations-cache": None,
             "--native": False,
             "--no-migrate": False,
+            "--parallel": None,
             "--persistent": True,
             "--persistent-path": "test",
             "--port": "8000",
             "--runner": "",
             "--runner-options": None,
+            "--socket": ".app_helper_tests.sock",
+            "--use-server": False,
             "--verbose": None,
             "--version": False,
             "--xvfb": False,
             "--use-daphne": False,
             "--use-channels": False,
+            "--workers": None,
+            "--no-reload": False,
+            "--watch": None,
+            "--reload-debounce": None,
+            "--requests": None,
+            "--concurrency": None,
+            "--user": None,
+            "--asgi": False,
+            "--per-url": False,
+            "--profile": None,
+            "--profile-startup": None,
+            "--queries-summary": False,
             "<application>": "example1",
             "<command>": None,
             "<extra-applications>": [],
+            "<url>": [],
             "<test-label>": [],
             "authors": False,
+            "bench": False,
             "cms_check": False,
             "compilemessages": False,
             "makemessages": False,
             "makemigrations": False,
+            "serve-tests": False,
             "options": [
                 "helper.py",
                 "test",
@@ -221,6 +245,7 @@ class CommandTests(unittest.TestCase):
         ]
         target_2 = {
             "--bind": "127.0.0.1",
+            "--changed-since": None,
             "--cms": True,
             "--dry-run": False,
             "--empty": False,
@@ -230,27 +255,46 @@ class CommandTests(unittest.TestCase):
             "--locale": None,
             "--merge": False,
             "--migrate": False,
+            "--migrations-cache": None,
             "--native": False,
             "--no-migrate": False,
+            "--parallel": None,
             "--persistent": True,
             "--persistent-path": "test",
             "--port": "8000",
             "--runner": "",
             "--runner-options": None,
+            "--socket": ".app_helper_tests.sock",
+            "--use-server": False,
             "--verbose": None,
             "--version": False,
             "--xvfb": False,
             "--use-daphne": False,
             "--use-channels": False,
+            "--workers": None,
+            "--no-reload": False,
+            "--watch": None,
+            "--reload-debounce": None,
+            "--requests": None,
+            "--concurrency": None,
+            "--user": None,
+            "--asgi": False,
+            "--per-url": False,
+            "--profile": None,
+            "--profile-startup": None,
+            "--queries-summary": False,
             "<application>": "example1",
             "<command>": None,
             "<extra-applications>": [],
+            "<url>": [],
             "<test-label>": [],
             "authors": False,
+            "bench": False,
             "cms_check": False,
             "compilemessages": False,
             "makemessages": False,
             "makemigrations": False,
+            "serve-tests": False,
             "options": [
                 "helper.py",
                 "server",
@@ -275,6 +319,7 @@ class CommandTests(unittest.TestCase):
         ]
         target_3 = {
             "--bind": "127.0.0.1",
+            "--changed-since": None,
             "--cms": True,
             "--dry-run": False,
             "--empty": False,
@@ -284,27 +329,46 @@ class CommandTests(unittest.TestCase):
             "--locale": None,
             "--merge": False,
             "--migrate": False,
+            "--migrations-cache": None,
             "--native": False,
             "--no-migrate": False,
+            "--parallel": None,
             "--persistent": True,
             "--persistent-path": "test",
             "--port": "8000",
             "--runner": "",
             "--runner-options": None,
+            "--socket": ".app_helper_tests.sock",
+            "--use-server": False,
             "--verbose": None,
             "--version": False,
             "--xvfb": False,
             "--use-daphne": False,
             "--use-channels": False,
+            "--workers": None,
+            "--no-reload": False,
+            "--watch": None,
+            "--reload-debounce": None,
+            "--requests": None,
+            "--concurrency": None,
+            "--user": None,
+            "--asgi": False,
+            "--per-url": False,
+            "--profile": None,
+            "--profile-startup": None,
+            "--queries-summary": False,
             "<application>": "example1",
             "<command>": "some_command",
             "<extra-applications>": [],
+            "<url>": [],
             "<test-label>": [],
             "authors": False,
+            "bench": False,
             "cms_check": False,
             "compilemessages": False,
             "makemessages": False,
             "makemigrations": False,
+            "serve-tests": False,
             "options": [
                 "helper.py",
                 "some_command",
@@ -330,6 +394,10 @@ class CommandTests(unittest.TestCase):
         args = _map_argv(argv_3, application_module)
         self.assertEqual(target_3, args)
 
+        args = _map_argv(["helper.py", "example1", "test", "--profile-startup", "example1"], application_module)
+        self.assertEqual(args["--profile-startup"], "")
+        self.assertEqual(args["<test-label>"], ["example1"])
+
     def test_extra_settings(self):
         """Settings declared in helper file are merged in default settings."""
         from django.conf import settings
@@ -381,7 +449,7 @@ class CommandTests(unittest.TestCase):
                         # Check template dirs
                         self.assertTrue("some/dir" in local_settings.TEMPLATES[0]["DIRS"])
 
-    @patch("app_helper.server.autoreload.run_with_reloader")
+    @patch("app_helper.server.run_with_reloader")
     def test_server_django(self, run_with_reloader):
         """Run server command and create default user - django version."""
         with work_in(self.basedir):
@@ -393,9 +461,12 @@ class CommandTests(unittest.TestCase):
                 core(args, self.application)
             self.assertTrue("A admin user (username: admin, password: admin) has been created." in out.getvalue())
             self.assertEqual(run_with_reloader.call_args[0][0].__module__, "django.core.management.commands.runserver")
+            watch_paths = run_with_reloader.call_args[1]["watch_paths"]
+            self.assertIn(os.path.join(self.basedir, "example1"), watch_paths)
+            self.assertIn(os.path.join(self.basedir, "helper.py"), watch_paths)
         User.objects.all().delete()
 
-    @patch("app_helper.server.autoreload.run_with_reloader")
+    @patch("app_helper.server.run_with_reloader")
     def test_server_channels(self, run_with_reloader):
         """Run server command and create default user - channels version."""
         try:
@@ -414,7 +485,7 @@ class CommandTests(unittest.TestCase):
             self.assertEqual(run_with_reloader.call_args[0][0].__module__, "channels.management.commands.runserver")
         User.objects.all().delete()
 
-    @patch("app_helper.server.autoreload.run_with_reloader")
+    @patch("app_helper.server.run_with_reloader")
     def test_server_daphne(self, run_with_reloader):
         """Run server command and create default user - daphne version."""
         try:
@@ -433,6 +504,190 @@ class CommandTests(unittest.TestCase):
             self.assertEqual(run_with_reloader.call_args[0][0].__module__, "daphne.cli")
         User.objects.all().delete()
 
+    def test_bench(self):
+        """Run bench command through the WSGI handler."""
+        with work_in(self.basedir):
+            with captured_output() as (out, err):
+                args = copy(DEFAULT_ARGS)
+                args["bench"] = True
+                args["<url>"] = ["/en/admin/", "/static/admin/css/base.css"]
+                args["--requests"] = "5"
+                # requests are sent from the current thread, which shares the in-memory test database
+                args["--concurrency"] = "1"
+                args["--user"] = "admin"
+                args["--per-url"] = True
+                core(args, self.application)
+            lines = out.getvalue().splitlines()
+            self.assertTrue(lines[-4].startswith("URL "))
+            self.assertEqual(lines[-3].split()[:3], ["/en/admin/", "5", "0"])
+            self.assertEqual(lines[-2].split()[:3], ["/static/admin/css/base.css", "5", "0"])
+            self.assertEqual(lines[-1].split()[:3], ["Total", "10", "0"])
+
+    def test_bench_asgi(self):
+        """Run bench command through the ASGI handler."""
+        with work_in(self.basedir):
+            with captured_output() as (out, err):
+                args = copy(DEFAULT_ARGS)
+                args["bench"] = True
+                args["<url>"] = ["/en/admin/"]
+                args["--requests"] = "4"
+                args["--concurrency"] = "2"
+                args["--asgi"] = True
+                core(args, self.application)
+            lines = out.getvalue().splitlines()
+            # not authenticated: redirect to the login page
+            self.assertEqual(lines[-1].split()[:3], ["Total", "4", "0"])
+            self.assertTrue(lines[-2].startswith("URL "))
+
+    def test_asgi_get_application(self):
+        """Build the ASGI application from the helper file."""
+        from asgiref.sync import async_to_sync
+        from django.conf import settings
+        from django.test import AsyncRequestFactory
+
+        from app_helper.asgi import get_application
+        from app_helper.bench import _asgi_request
+
+        with work_in(self.basedir):
+            with captured_output():
+                application = get_application("example1", "helper.py", cms=True)
+                self.assertIs(get_application("example1", "helper.py", cms=True), application)
+            self.assertEqual(settings.BASE_APPLICATION, "example1")
+            self.assertTrue(settings.USE_CMS)
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+            # views run in the current thread, which shares the in-memory test database
+            __, status = async_to_sync(_asgi_request)(application, AsyncRequestFactory(), "/en/admin/login/")
+            self.assertEqual(status, 200)
+
+    @patch("app_helper.server.run_with_reloader")
+    def test_server_profile(self, run_with_reloader):
+        """Run server command with requests profiling."""
+        from importlib import import_module
+
+        from django.conf import settings
+        from django.test import Client
+
+        from app_helper.main import _map_argv
+        from app_helper.request_profile import PROFILE_DIR, PROFILE_URL, _profiles
+
+        profile_dir = mkdtemp()
+        try:
+            with work_in(self.basedir):
+                args = _map_argv(["helper.py", "example1", "server", "--profile"], import_module("example1"))
+                self.assertEqual(args["--profile"], PROFILE_DIR)
+                with captured_output():
+                    args = copy(DEFAULT_ARGS)
+                    args["server"] = True
+                    args["--profile"] = profile_dir
+                    core(args, self.application)
+                self.assertEqual(settings.MIDDLEWARE[0], "app_helper.request_profile.ProfilingMiddleware")
+                settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "testserver"]
+                settings.APP_HELPER_PROFILE_THRESHOLD = 0
+                _profiles.clear()
+                client = Client()
+                client.force_login(get_user_model().objects.get(username="admin"))
+                self.assertEqual(client.get("/en/admin/").status_code, 200)
+                profile = _profiles[-1]
+                self.assertEqual(profile.path, "/en/admin/")
+                self.assertGreater(profile.queries, 0)
+                self.assertGreater(profile.templates_time, 0)
+                self.assertEqual(os.listdir(profile_dir), [profile.dump])
+                # profiles index and dumps are not profiled
+                response = client.get("/{}".format(PROFILE_URL))
+                self.assertIn(profile.dump, response.content.decode("utf-8"))
+                self.assertEqual(client.get("/{}{}".format(PROFILE_URL, profile.dump)).status_code, 200)
+                self.assertEqual(len(_profiles), 1)
+        finally:
+            shutil.rmtree(profile_dir)
+
+    @patch("app_helper.server.run_with_reloader")
+    @patch("django.core.management.commands.runserver.Command.inner_run")
+    def test_server_no_reload(self, inner_run, run_with_reloader):
+        """Run server command without the autoreloader."""
+        with work_in(self.basedir):
+            with captured_output() as (out, err):
+                args = copy(DEFAULT_ARGS)
+                args["server"] = True
+                args["--no-reload"] = True
+                core(args, self.application)
+            run_with_reloader.assert_not_called()
+            self.assertFalse(inner_run.call_args[1]["use_reloader"])
+        get_user_model().objects.all().delete()
+
+    @patch("app_helper.server.run_with_reloader")
+    def test_server_reload_skip_setup(self, run_with_reloader):
+        """Processes restarted by the autoreloader skip the database setup if nothing changed."""
+        from app_helper import server
+
+        with work_in(self.basedir), patch.dict(os.environ):
+            os.environ.pop(server.STATE_VARIABLE, None)
+            args = copy(DEFAULT_ARGS)
+            args["server"] = True
+            with captured_output():
+                core(args, self.application)
+            state_path = os.environ[server.STATE_VARIABLE]
+            self.assertTrue(os.path.exists(state_path))
+
+            os.environ["RUN_MAIN"] = "true"
+            with patch("app_helper.server._create_db") as create_db, captured_output():
+                core(args, self.application)
+            create_db.assert_not_called()
+
+            with open(state_path, "w") as state:
+                state.write("changed")
+            with patch("app_helper.server._create_db") as create_db, captured_output():
+                core(args, self.application)
+            create_db.assert_called_once()
+            with open(state_path) as state:
+                self.assertNotEqual(state.read(), "changed")
+            server._remove_state(state_path)
+        get_user_model().objects.all().delete()
+
+    def test_server_workers(self):
+        """Serve requests from pre-forked workers."""
+        import socket
+        from urllib.request import urlopen
+
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from app_helper.main import main; main(sys.argv)",
+                self.application,
+                "server",
+                "--cms",
+                "--port=%s" % port,
+                "--workers=2",
+                "--no-reload",
+            ],
+            cwd=self.basedir,
+            env=self._get_subprocess_env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            statuses = []
+            for _i in range(600):
+                if server.poll() is not None:
+                    break
+                try:
+                    with urlopen("http://127.0.0.1:%s/en/admin/login/" % port, timeout=10) as response:
+                        statuses.append(response.status)
+                except OSError:
+                    time.sleep(0.1)
+                    continue
+                if len(statuses) == 4:
+                    break
+            self.assertEqual(statuses, [200] * 4)
+        finally:
+            server.send_signal(signal.SIGINT)
+            out = server.communicate(timeout=30)[0].decode("utf-8")
+        self.assertIn("with 2 workers", out)
+        self.assertIn("A admin user (username: admin, password: admin) has been created.", out)
+
     def test_makemigrations(self):
         """Run makemigrations command."""
         with captured_output() as (out, err):
@@ -580,13 +835,148 @@ class CommandTests(unittest.TestCase):
                     args["--runner"] = "runners.CapturedOutputRunner"
                     args["<test-label>"] = self.application
                     core(args, self.application)
-            self.assertTrue("Ran 14 tests in" in err.getvalue())
+            self.assertTrue("Ran 17 tests in" in err.getvalue())
             self.assertEqual(exit_state.exception.code, 0)
             self.assertTrue(args["STATIC_ROOT"].startswith(path))
             self.assertTrue(args["MEDIA_ROOT"].startswith(path))
             self.assertTrue(os.path.exists(args["STATIC_ROOT"]))
             self.assertTrue(os.path.exists(args["MEDIA_ROOT"]))
 
+    def test_testrun_parallel(self):
+        """Run test with parallel option enabled."""
+        try:
+            import cms  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+        with wrap_test_environment():
+            with captured_output() as (out, err):
+                with self.assertRaises(SystemExit) as exit_state:
+                    args = copy(DEFAULT_ARGS)
+                    args["test"] = True
+                    args["<application>"] = "example1"
+                    args["--runner"] = "runners.CapturedOutputRunner"
+                    args["<test-label>"] = self.application
+                    args["--parallel"] = "2"
+                    core(args, self.application)
+            self.assertTrue("Ran 17 tests in" in err.getvalue())
+            self.assertEqual(exit_state.exception.code, 0)
+
+    def _get_subprocess_env(self):
+        """Environment to run app_helper in a subprocess from the sample applications directory."""
+        env = copy(os.environ)
+        env.pop("AUTH_USER_MODEL", None)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [os.path.dirname(os.path.dirname(self.basedir)), env.get("PYTHONPATH", "")]
+        )
+        return env
+
+    def test_testrun_migrations_cache(self):
+        """Run test twice using the migrations snapshot cache, the second run restores the cached snapshot."""
+        try:
+            import cms  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+        cache_dir = mkdtemp()
+        snapshots = []
+        for _run in range(2):
+            # run in a new process as the test database of the current one is already migrated
+            result = subprocess.run(
+                [
+                    sys.executable,
+                    "-c",
+                    "import sys; from app_helper.main import main; main(sys.argv)",
+                    self.application,
+                    "test",
+                    self.application,
+                    "--cms",
+                    "--runner=runners.CapturedOutputRunner",
+                    "--migrations-cache=%s" % cache_dir,
+                ],
+                cwd=self.basedir,
+                env=self._get_subprocess_env(),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            self.assertTrue(b"Ran 17 tests in" in result.stderr)
+            self.assertEqual(result.returncode, 0)
+            snapshots.append({name: os.stat(os.path.join(cache_dir, name)).st_mtime for name in os.listdir(cache_dir)})
+        self.assertEqual(len(snapshots[0]), 1)
+        self.assertEqual(snapshots[0], snapshots[1])
+        shutil.rmtree(cache_dir)
+
+    def test_profile_startup(self):
+        """Startup phases timings are saved by --profile-startup option, and not passed to Django commands."""
+        try:
+            import cms  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+        output = os.path.join(mkdtemp(), "startup.json")
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from app_helper.main import main; main(sys.argv)",
+                self.application,
+                "check",
+                "--cms",
+                "--profile-startup=%s" % output,
+            ],
+            cwd=self.basedir,
+            env=self._get_subprocess_env(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(b"System check identified no issues", result.stdout)
+        with open(output) as report:
+            self.assertEqual(json.load(report)[0]["name"], "main")
+        shutil.rmtree(os.path.dirname(output))
+
+    def test_testrun_server(self):
+        """Run test via the serve-tests forking server."""
+        try:
+            import cms  # noqa: F401
+        except ImportError:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+        socket_path = os.path.join(mkdtemp(), "tests.sock")
+        server = subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from app_helper.main import main; main(sys.argv)",
+                self.application,
+                "serve-tests",
+                "--cms",
+                "--runner=runners.CapturedOutputRunner",
+                "--socket=%s" % socket_path,
+            ],
+            cwd=self.basedir,
+            env=self._get_subprocess_env(),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            for _i in range(600):
+                if os.path.exists(socket_path) or server.poll() is not None:
+                    break
+                time.sleep(0.1)
+            self.assertTrue(os.path.exists(socket_path))
+            for _run in range(2):
+                with captured_output() as (out, err):
+                    with self.assertRaises(SystemExit) as exit_state:
+                        args = copy(DEFAULT_ARGS)
+                        args["test"] = True
+                        args["--use-server"] = True
+                        args["--socket"] = socket_path
+                        args["<test-label>"] = [self.application]
+                        core(args, self.application)
+                self.assertTrue("Ran 17 tests in" in out.getvalue())
+                self.assertEqual(exit_state.exception.code, 0)
+        finally:
+            server.send_signal(signal.SIGINT)
+            server.wait(timeout=30)
+        self.assertFalse(os.path.exists(socket_path))
+
     def test_testrun_runner_options(self):
         """Run test with additional options."""
         try:
@@ -624,7 +1014,7 @@ class CommandTests(unittest.TestCase):
                     args["--runner"] = "runners.CapturedOutputRunner"
                     args["<test-label>"] = self.application
                     core(args, self.application)
-            self.assertTrue("Ran 14 tests in" in err.getvalue())
+            self.assertTrue("Ran 17 tests in" in err.getvalue())
             self.assertEqual(exit_state.exception.code, 0)
             self.assertTrue(args["STATIC_ROOT"].startswith(path))
             self.assertTrue(args["MEDIA_ROOT"].startswith(path))
@@ -674,7 +1064,7 @@ class CommandTests(unittest.TestCase):
             self.assertTrue("visible string" in out.getvalue())
             self.assertFalse("hidden string" in out.getvalue())
             self.assertFalse("hidden string" in err.getvalue())
-            self.assertTrue("Ran 14 tests in" in err.getvalue())
+            self.assertTrue("Ran 17 tests in" in err.getvalue())
             self.assertEqual(exit_state.exception.code, 0)
 
     def test_runner_compat(self):
@@ -695,7 +1085,7 @@ class CommandTests(unittest.TestCase):
         self.assertTrue("visible string" in out.getvalue())
         self.assertFalse("hidden string" in out.getvalue())
         self.assertFalse("hidden string" in err.getvalue())
-        self.assertTrue("Ran 14 tests in" in err.getvalue())
+        self.assertTrue("Ran 17 tests in" in err.getvalue())
         self.assertEqual(exit_state.exception.code, 0)
 
     def test_runner_cms_exception(self):
@@ -807,7 +1197,7 @@ class CommandTests(unittest.TestCase):
                         args["--cms"] = False
                         args["--runner"] = "runners.CapturedOutputRunner"
                         core(args, self.application)
-        self.assertTrue("Ran 14 tests in" in err.getvalue())
+        self.assertTrue("Ran 17 tests in" in err.getvalue())
         self.assertEqual(exit_state.exception.code, 0)
 
     def test_runner_nocms(self):
@@ -822,7 +1212,7 @@ class CommandTests(unittest.TestCase):
                         args.append("test")
                         args.append("--extra-settings=helper.py")
                         runner.run("example1", args, extra_args=["--runner=runners.CapturedOutputRunner"])
-        self.assertTrue("Ran 14 tests in" in err.getvalue())
+        self.assertTrue("Ran 17 tests in" in err.getvalue())
         self.assertEqual(exit_state.exception.code, 0)
 
     def test_testrun_native(self):
@@ -844,7 +1234,7 @@ class CommandTests(unittest.TestCase):
                         core(args, self.application)
                     except SystemExit:
                         pass
-        self.assertTrue("Ran 14 tests in" in err.getvalue())
+        self.assertTrue("Ran 17 tests in" in err.getvalue())
 
     def test_testrun_pytest(self):
         """Run tests via pytest via API."""
@@ -866,9 +1256,9 @@ class CommandTests(unittest.TestCase):
                     core(args, self.application)
                 except SystemExit:
                     pass
-        self.assertTrue("64 items / 63 deselected / 1 selected" in out.getvalue())
+        self.assertTrue("124 items / 123 deselected / 1 selected" in out.getvalue())
         # warnings will depend on django version and adds too much noise
-        self.assertTrue("1 passed, 63 deselected" in out.getvalue())
+        self.assertTrue("1 passed, 123 deselected" in out.getvalue())
 
     def test_runner_pytest(self):
         """Run tests via pytest via helper runner."""
@@ -883,9 +1273,9 @@ class CommandTests(unittest.TestCase):
                     args.append("--runner-options='-k test_create_django_image_object'")
                     args.append("--runner=app_helper.pytest_runner.PytestTestRunner")
                     runner.run("example1", args)
-            self.assertTrue("64 items / 63 deselected / 1 selected" in out.getvalue())
+            self.assertTrue("124 items / 123 deselected / 1 selected" in out.getvalue())
             # # warnings will depend on django version and adds too much noise
-            self.assertTrue("1 passed, 63 deselected" in out.getvalue())
+            self.assertTrue("1 passed, 123 deselected" in out.getvalue())
             self.assertEqual(exit_state.exception.code, 0)
 
     def test_authors(self):
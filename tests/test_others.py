@@ -1,7 +1,49 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
 import unittest
-from tempfile import gettempdir
+from pathlib import Path
+from tempfile import gettempdir, mkdtemp
+from unittest.mock import patch
 
-from app_helper.utils import make_temp_dir
+from django.test.runner import DiscoverRunner
+
+from app_helper import settings_cache
+from app_helper.parallel import (
+    WORKER_API_VERSIONS,
+    AppHelperParallelTestSuite,
+    get_parallel_runner,
+    has_worker_api,
+    parse_parallel,
+)
+from app_helper.pytest_runner import PytestTestRunner
+from app_helper.query_budget import (
+    QueryRecord,
+    collect_records,
+    is_collecting,
+    normalize_sql,
+    record_queries,
+    summary,
+)
+from app_helper.reloader import InotifyReloader, InotifyUnavailable, watched_paths
+from app_helper.settings_cache import (
+    CACHE_DIR_VARIABLE,
+    Placeholder,
+    clear_cache,
+    decode_settings,
+    encode_settings,
+    get_cached_settings,
+    resolve_placeholders,
+    set_cached_settings,
+    settings_cache_key,
+)
+from app_helper.startup_profile import profiler, startup_phase
+from app_helper.static_files import files_changed, get_index, serve
+from app_helper.test_selection import select_test_labels
+from app_helper.utils import DisableMigrations, captured_output, make_temp_dir
 
 
 class TestUtils(unittest.TestCase):
@@ -14,3 +56,466 @@ class TestUtils(unittest.TestCase):
         temp1 = make_temp_dir("suff", container="/some/random/path")
         self.assertTrue(temp1.startswith(gettempdir()))
         self.assertTrue(temp1.endswith("suff"))
+
+    def test_version_flags(self):
+        import django
+
+        from app_helper import utils
+
+        django_flag = "DJANGO_{}_{}".format(*django.VERSION[:2])
+        if django_flag in utils.DJANGO_FLAGS:
+            self.assertTrue(getattr(utils, django_flag))
+        self.assertEqual(sum(getattr(utils, flag) for flag in utils.DJANGO_FLAGS), 1)
+        self.assertTrue(utils.django_version_between("{}.{}".format(*django.VERSION[:2])))
+        self.assertFalse(utils.django_version_between(upper="2.0"))
+        self.assertIn("CMS_311", dir(utils))
+        with self.assertRaises(AttributeError):
+            utils.DJANGO_1_0
+        try:
+            import cms
+        except ImportError:
+            self.assertFalse(utils.CMS)
+            self.assertFalse(any(getattr(utils, flag) for flag in utils.CMS_FLAGS))
+        else:
+            self.assertTrue(utils.CMS)
+            self.assertTrue(utils.cms_version_between(cms.__version__))
+            self.assertFalse(utils.cms_version_between(upper="3.0"))
+
+    def test_version_tuple(self):
+        from app_helper.utils import _version_tuple
+
+        self.assertEqual(_version_tuple("3.11"), (3, 11))
+        self.assertEqual(_version_tuple("4.1.0rc1"), (4, 1, 0))
+        self.assertEqual(_version_tuple("4.0.dev1"), (4, 0))
+
+
+class TestParallel(unittest.TestCase):
+    def test_parse_parallel(self):
+        self.assertEqual(parse_parallel(None), 0)
+        self.assertEqual(parse_parallel("4"), 4)
+        self.assertGreaterEqual(parse_parallel("auto"), 1)
+        with self.assertRaises(ValueError):
+            parse_parallel("many")
+
+    def test_get_parallel_runner(self):
+        parallel_runner = get_parallel_runner(DiscoverRunner)
+        self.assertTrue(issubclass(parallel_runner, DiscoverRunner))
+        self.assertEqual(parallel_runner.parallel_test_suite, AppHelperParallelTestSuite)
+        self.assertEqual(DiscoverRunner.parallel_test_suite.__name__, "ParallelTestSuite")
+        self.assertEqual(get_parallel_runner(PytestTestRunner), PytestTestRunner)
+
+    def test_get_parallel_runner_unsupported_django(self):
+        with patch("django.VERSION", WORKER_API_VERSIONS[1] + (0, "final", 0)):
+            self.assertFalse(has_worker_api())
+            self.assertEqual(get_parallel_runner(DiscoverRunner), DiscoverRunner)
+        self.assertTrue(has_worker_api())
+
+    def test_pytest_parallel_without_xdist(self):
+        with patch.dict("sys.modules", {"xdist": None}), patch("pytest.main") as pytest_main:
+            with self.assertRaises(ImportError) as context:
+                PytestTestRunner(parallel=2).run_tests([])
+        self.assertIn("pytest-xdist", str(context.exception))
+        pytest_main.assert_not_called()
+
+
+class TestTestSelection(unittest.TestCase):
+    files = {
+        "helper.py": "HELPER_SETTINGS = {}\n",
+        "selectapp/__init__.py": "",
+        "selectapp/models.py": "MODEL = 1\n",
+        "selectapp/utils.py": "from .models import MODEL\n",
+        "selectapp/views.py": "TEMPLATE = 'selectapp/page.html'\n",
+        "selectapp/templates/selectapp/page.html": "<html></html>\n",
+        "selectapp/migrations/__init__.py": "",
+        "selectapp_tests/__init__.py": "",
+        "selectapp_tests/test_utils.py": "from selectapp.utils import MODEL\n",
+        "selectapp_tests/test_views.py": "from selectapp import views\n",
+    }
+
+    def setUp(self):
+        self.root = mkdtemp()
+        for path, content in self.files.items():
+            self._write(path, content)
+        git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        for command in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", "initial"]):
+            subprocess.check_call(git + command, cwd=self.root)
+        sys.path.insert(0, self.root)
+
+    def tearDown(self):
+        sys.path.remove(self.root)
+        shutil.rmtree(self.root)
+
+    def _write(self, path, content):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as target:
+            target.write(content)
+
+    def _select(self, pytest=False):
+        return select_test_labels(
+            ["selectapp_tests"], "selectapp", "HEAD", root=self.root, pytest=pytest, verbose=False
+        )
+
+    def test_no_changes(self):
+        self.assertEqual(self._select(), [])
+
+    def test_module_changed(self):
+        self._write("selectapp/models.py", "MODEL = 2\n")
+        self.assertEqual(self._select(), ["selectapp_tests.test_utils"])
+        self.assertEqual(self._select(pytest=True), [os.path.join(self.root, "selectapp_tests", "test_utils.py")])
+
+    def test_template_changed(self):
+        self._write("selectapp/templates/selectapp/page.html", "<html><body></body></html>\n")
+        self.assertEqual(self._select(), ["selectapp_tests.test_views"])
+
+    def test_new_test_module(self):
+        self._write("selectapp_tests/test_new.py", "import os\n")
+        self.assertEqual(self._select(), ["selectapp_tests.test_new"])
+
+    def test_full_suite(self):
+        self._write("selectapp/migrations/0001_initial.py", "")
+        self.assertIsNone(self._select())
+        os.unlink(os.path.join(self.root, "selectapp/migrations/0001_initial.py"))
+        self._write("helper.py", "HELPER_SETTINGS = {'DEBUG': True}\n")
+        self.assertIsNone(self._select())
+
+    def test_module_removed(self):
+        os.unlink(os.path.join(self.root, "selectapp/utils.py"))
+        self.assertIsNone(self._select())
+
+    def test_unresolved_import(self):
+        self._write("selectapp_tests/test_utils.py", "from selectapp.helpers import MODEL\n")
+        self.assertIsNone(self._select())
+
+    def test_no_affected_module(self):
+        self._write("selectapp/unused.py", "UNUSED = 1\n")
+        self.assertIsNone(self._select())
+
+    def test_no_git(self):
+        root = mkdtemp()
+        self.assertIsNone(select_test_labels(["selectapp_tests"], "selectapp", "HEAD", root=root, verbose=False))
+        shutil.rmtree(root)
+
+
+class TestStartupProfile(unittest.TestCase):
+    def tearDown(self):
+        profiler.enabled = False
+
+    def _run_phases(self):
+        @startup_phase("inner")
+        def inner():
+            pass
+
+        with startup_phase("outer"):
+            inner()
+            inner()
+
+    def test_disabled(self):
+        self._run_phases()
+        self.assertEqual(profiler.phases, [])
+
+    def test_report_table(self):
+        profiler.enable()
+        self._run_phases()
+        with captured_output() as (out, err):
+            profiler.report()
+            profiler.report()
+        lines = err.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith("Startup phase"))
+        self.assertTrue(lines[1].startswith("outer "))
+        self.assertTrue(lines[2].startswith("  inner "))
+        # phases after the report are not recorded
+        self._run_phases()
+        self.assertEqual(len(profiler.phases), 1)
+
+    def test_report_json(self):
+        output = os.path.join(mkdtemp(), "startup.json")
+        profiler.enable(output)
+        self._run_phases()
+        profiler.report()
+        with open(output) as report:
+            phases = json.load(report)
+        self.assertEqual(phases[0]["name"], "outer")
+        self.assertEqual([child["name"] for child in phases[0]["children"]], ["inner", "inner"])
+        self.assertGreaterEqual(phases[0]["duration"], sum(child["duration"] for child in phases[0]["children"]))
+        shutil.rmtree(os.path.dirname(output))
+
+
+class TestQueryBudget(unittest.TestCase):
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql('SELECT "a"."id" FROM "a" WHERE "a"."name" = \'it\'\'s\' AND "a"."b_id" = 12'),
+            'SELECT "a"."id" FROM "a" WHERE "a"."name" = ? AND "a"."b_id" = ?',
+        )
+        self.assertEqual(
+            normalize_sql('SELECT 1 FROM "t2" WHERE "t2"."id" IN (1, 2, 3) LIMIT 21'),
+            'SELECT ? FROM "t2" WHERE "t2"."id" IN (...) LIMIT ?',
+        )
+
+    def test_summary(self):
+        self.assertEqual(summary([]), "")
+        record = QueryRecord("tests.Test.test_many")
+        record.queries = [("default", "SELECT * FROM t WHERE id = {}".format(pk), 0.01) for pk in range(6)]
+        other = QueryRecord("tests.Test.test_one")
+        other.queries = [("default", "SELECT 1", 0.5)]
+        self.assertEqual(record.repeated, ("SELECT * FROM t WHERE id = ?", 6))
+        records = [record.stats(), QueryRecord("tests.Test.test_none").stats(), other.stats()]
+        self.assertEqual(
+            summary(records).splitlines(),
+            [
+                "Tests executing the most queries:",
+                " Queries  Time (s)  Repeated  Test",
+                "       6     0.060         6  tests.Test.test_many (possible N+1 queries)",
+                "       1     0.500         1  tests.Test.test_one",
+            ],
+        )
+        self.assertEqual(len(summary(records, limit=1).splitlines()), 3)
+
+    def test_collect_records(self):
+        self.assertFalse(is_collecting())
+        with collect_records() as outer:
+            self.assertTrue(is_collecting())
+            with collect_records() as inner:
+                with record_queries([], "tests.Test.test_inner"):
+                    pass
+            with record_queries([], "tests.Test.test_outer"):
+                pass
+        self.assertFalse(is_collecting())
+        self.assertEqual([record.test for record in inner], ["tests.Test.test_inner"])
+        self.assertEqual([record.test for record in outer], ["tests.Test.test_outer"])
+
+
+class TestSettingsCache(unittest.TestCase):
+    args = {"test": True, "--cms": False, "--extra-settings": None}
+
+    def setUp(self):
+        self.cache_dir = mkdtemp()
+        self._environ = os.environ.copy()
+        os.environ[CACHE_DIR_VARIABLE] = self.cache_dir
+        clear_cache()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._environ)
+        clear_cache()
+        shutil.rmtree(self.cache_dir)
+
+    def test_encode_decode(self):
+        settings = {
+            "MIGRATION_MODULES": DisableMigrations(),
+            "LANGUAGES": (("en", "English"), ("it", "Italiano")),
+            "INSTALLED_APPS": ["django.contrib.auth"],
+            "STATIC_ROOT": Placeholder("STATIC_ROOT"),
+            "CMS_LANGUAGES": {"default": {"public": True}},
+        }
+        decoded = decode_settings(json.loads(json.dumps(encode_settings(settings))))
+        self.assertIsInstance(decoded.pop("MIGRATION_MODULES"), DisableMigrations)
+        settings.pop("MIGRATION_MODULES")
+        self.assertEqual(decoded, settings)
+        self.assertEqual(resolve_placeholders(decoded, STATIC_ROOT="/static")["STATIC_ROOT"], "/static")
+        with self.assertRaises(TypeError):
+            encode_settings({"SOME_SETTING": object()})
+        with self.assertRaises(TypeError):
+            encode_settings({"CMS_LANGUAGES": {1: []}})
+
+    def test_key(self):
+        key = settings_cache_key(self.args, "example1", "helper.py")
+        self.assertEqual(key, settings_cache_key(dict(self.args), "example1", "helper.py"))
+        self.assertNotEqual(key, settings_cache_key(dict(self.args, test=False), "example1", "helper.py"))
+        self.assertNotEqual(key, settings_cache_key(self.args, "example2", "helper.py"))
+        os.environ["DATABASE_URL"] = "sqlite://localhost/other.sqlite"
+        self.assertNotEqual(key, settings_cache_key(self.args, "example1", "helper.py"))
+        os.environ.pop("DATABASE_URL")
+        os.environ.update({name: value for name, value in self._environ.items() if name == "DATABASE_URL"})
+        self.assertEqual(key, settings_cache_key(self.args, "example1", "helper.py"))
+        # packages installed or upgraded after the settings are cached
+        with patch.object(settings_cache, "_distributions", ["Django==0.1"]):
+            self.assertNotEqual(key, settings_cache_key(self.args, "example1", "helper.py"))
+
+    def test_cache(self):
+        key = settings_cache_key(self.args, "example1", "helper.py")
+        self.assertIsNone(get_cached_settings(key))
+        settings = {"INSTALLED_APPS": ["example1"], "MIGRATION_MODULES": DisableMigrations()}
+        set_cached_settings(key, settings)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        # copies are returned from the in-process cache
+        cached = get_cached_settings(key)
+        cached["INSTALLED_APPS"].append("example2")
+        self.assertEqual(get_cached_settings(key)["INSTALLED_APPS"], ["example1"])
+        # disk cache
+        clear_cache()
+        self.assertIsInstance(get_cached_settings(key)["MIGRATION_MODULES"], DisableMigrations)
+
+    def test_cache_disabled(self):
+        del os.environ[CACHE_DIR_VARIABLE]
+        key = settings_cache_key(self.args, "example1", "helper.py")
+        set_cached_settings(key, {"INSTALLED_APPS": ["example1"]})
+        self.assertIsNone(get_cached_settings(key))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_cache_not_serializable(self):
+        key = settings_cache_key(self.args, "example1", "helper.py")
+        set_cached_settings(key, {"SOME_SETTING": Exception})
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(get_cached_settings(key), {"SOME_SETTING": Exception})
+
+
+class TestReloader(unittest.TestCase):
+    def setUp(self):
+        try:
+            InotifyReloader.check_availability()
+        except InotifyUnavailable as e:
+            raise unittest.SkipTest(str(e))
+        self.root = mkdtemp()
+        self.package = os.path.join(self.root, "package")
+        os.makedirs(os.path.join(self.package, "templates"))
+        self.helper = os.path.join(self.root, "helper.py")
+        for path in (self.helper, os.path.join(self.root, "other.py"), os.path.join(self.package, "models.py")):
+            with open(path, "w") as source:
+                source.write("")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, *path):
+        with open(os.path.join(self.root, *path), "w") as source:
+            source.write("# changed")
+
+    def test_watched_paths(self):
+        class Settings:
+            BASE_APPLICATION = "app_helper"
+            TEMPLATES = [{"DIRS": ["templates"]}]
+            LOCALE_PATHS = ["locale"]
+            MEDIA_ROOT = "media"
+            APP_HELPER_WATCH_PATHS = ["/some/path"]
+
+        import app_helper
+
+        self.assertEqual(
+            watched_paths(Settings, "helper.py"),
+            [
+                os.path.dirname(app_helper.__file__),
+                os.path.abspath("helper.py"),
+                os.path.abspath("templates"),
+                os.path.abspath("locale"),
+                os.path.abspath("media"),
+                "/some/path",
+            ],
+        )
+
+    def test_events(self):
+        reloader = InotifyReloader([self.package, self.helper])
+        reloader._start()
+        try:
+            self.assertEqual(reloader._read_events(0), [])
+            self._write("other.py")
+            self._write("package", "models.py.swp")
+            self._write("package", "templates", "base.html")
+            self._write("helper.py")
+            self.assertEqual(
+                sorted(set(reloader._read_events(1))),
+                [self.helper, os.path.join(self.package, "templates", "base.html")],
+            )
+            # new directories are watched
+            os.makedirs(os.path.join(self.package, "views"))
+            self.assertEqual(reloader._read_events(1), [os.path.join(self.package, "views")])
+            self._write("package", "views", "detail.py")
+            self.assertIn(os.path.join(self.package, "views", "detail.py"), reloader._read_events(1))
+        finally:
+            os.close(reloader._fd)
+
+    def test_tick(self):
+        reloader = InotifyReloader([self.package], debounce=0.3)
+        ticker = reloader.tick()
+        timers = [
+            threading.Timer(0.2, self._write, ("package", "models.py")),
+            threading.Timer(0.4, self._write, ("package", "admin.py")),
+        ]
+        for timer in timers:
+            timer.start()
+        with patch.object(reloader, "notify_file_changed") as notify_file_changed:
+            next(ticker)
+            while not notify_file_changed.called:
+                next(ticker)
+        ticker.close()
+        for timer in timers:
+            timer.join()
+        # changes are notified together, once no further change happens
+        self.assertEqual(
+            [call[0][0] for call in notify_file_changed.call_args_list],
+            [Path(self.package, "models.py"), Path(self.package, "admin.py")],
+        )
+        self.assertIsNone(reloader._fd)
+
+
+class TestStaticFiles(unittest.TestCase):
+    def setUp(self):
+        from django.test import RequestFactory
+
+        self.factory = RequestFactory()
+        self.media_root = mkdtemp()
+        with open(os.path.join(self.media_root, "image.png"), "wb") as image:
+            image.write(b"png")
+
+    def tearDown(self):
+        shutil.rmtree(self.media_root)
+
+    def test_serve(self):
+        from django.http import Http404
+
+        response = serve(self.factory.get("/static/admin/css/base.css"), "admin/css/base.css")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/css")
+        etag = response["ETag"]
+        response.close()
+        response = serve(self.factory.get("/static/admin/css/base.css", HTTP_IF_NONE_MATCH=etag), "admin/css/base.css")
+        self.assertEqual(response.status_code, 304)
+        with self.assertRaises(Http404):
+            serve(self.factory.get("/static/admin/css/none.css"), "admin/css/none.css")
+
+    def test_media_index(self):
+        index = get_index(self.media_root)
+        response = serve(self.factory.get("/media/image.png"), "image.png", self.media_root)
+        self.assertEqual(b"".join(response.streaming_content), b"png")
+        response.close()
+        # files added after the index is built are looked up on disk
+        with open(os.path.join(self.media_root, "new.txt"), "w") as text:
+            text.write("text")
+        response = serve(self.factory.get("/media/new.txt"), "new.txt", self.media_root)
+        self.assertEqual(response["Content-Type"], "text/plain")
+        response.close()
+        # directories are listed
+        response = serve(self.factory.get("/media/"), "", self.media_root, show_indexes=True)
+        self.assertIn(b"image.png", response.content)
+        # changes notified by the autoreloader invalidate the index, without reloading
+        entry = index.get("image.png")
+        self.assertTrue(files_changed(None, Path(self.media_root, "image.png")))
+        self.assertFalse(files_changed(None, Path(self.media_root, "module.py")))
+        self.assertFalse(files_changed(None, Path(gettempdir(), "image.png")))
+        with open(os.path.join(self.media_root, "image.png"), "wb") as image:
+            image.write(b"new png")
+        self.assertNotEqual(index.get("image.png").size, entry.size)
+
+    def test_media_changed_before_request(self):
+        from django.test import override_settings
+
+        # no request has built the media index yet: changes must not restart the server anyway
+        with override_settings(MEDIA_ROOT=self.media_root):
+            self.assertTrue(files_changed(None, Path(self.media_root, "upload", "image.png")))
+        self.assertIsNone(get_index(self.media_root)._entries)
+
+    def test_changed_without_reloader(self):
+        response = serve(self.factory.get("/media/image.png"), "image.png", self.media_root)
+        etag = response["ETag"]
+        response.close()
+        with open(os.path.join(self.media_root, "image.png"), "wb") as image:
+            image.write(b"edited png")
+        os.utime(os.path.join(self.media_root, "image.png"), ns=(0, 10**9))
+        response = serve(self.factory.get("/media/image.png", HTTP_IF_NONE_MATCH=etag), "image.png", self.media_root)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(b"".join(response.streaming_content), b"edited png")
+        response.close()
+        os.unlink(os.path.join(self.media_root, "image.png"))
+        self.assertIsNone(get_index(self.media_root).get("image.png"))
@@ -1,5 +1,6 @@
 import os
 import unittest
+from unittest.mock import patch
 
 from django.contrib.auth.models import AnonymousUser
 from django.test import tag
@@ -41,6 +42,28 @@ class FakeTests(BaseTestCase):
             pages = self.get_pages()
             self.assertEqual(len(pages), 2)
 
+    def test_pages_snapshot(self):
+        from django.conf import settings
+
+        if "cms" not in settings.INSTALLED_APPS:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+
+        from cms.models import Page, Placeholder, TreeNode
+
+        self._pages_snapshot = True
+        pages = self.get_pages()
+        pks = [page.pk for page in pages]
+        Placeholder.objects.all().delete()
+        Page.objects.all().delete()
+        TreeNode.objects.all().delete()
+        with patch("cms.api.create_page") as create_page:
+            pages = self.get_pages()
+        create_page.assert_not_called()
+        self.assertEqual([page.pk for page in pages], pks)
+        self.assertEqual([page.get_slug("en") for page in pages], ["page-title", "second-page"])
+        self.assertTrue(pages[0].is_published("en"))
+        self.assertEqual(self.client.get("/en/second-page/").status_code, 200)
+
     def test_get(self):
         from django.conf import settings
 
@@ -151,6 +174,28 @@ class FakeTests(BaseTestCase):
         self.assertEqual(image.height, 600)
         self.assertEqual(Image.objects.count(), 1)
 
+    def test_create_filer_images(self):
+        from filer.models import File, Image
+
+        # filer Image uses multi-table inheritance, thus images are saved one by one, parent rows included
+        self.assertIn(File, Image._meta.parents)
+        images = self.create_filer_images(self.user, 5, description="gallery")
+        self.assertEqual(len(images), 5)
+        self.assertEqual(Image.objects.count(), 5)
+        self.assertEqual(File.objects.count(), 5)
+        for index, image in enumerate(Image.objects.order_by("pk"), start=1):
+            self.assertEqual(image.pk, images[index - 1].pk)
+            self.assertEqual(image.original_filename, "image_{}.jpg".format(index))
+            self.assertEqual(image.description, "gallery")
+            self.assertEqual(image.owner, self.user)
+            self.assertEqual(image.file.name, images[0].file.name)
+            self.assertEqual(image.width, 800)
+            self.assertEqual(image.height, 600)
+        self.assertEqual(self.create_filer_images(self.user, 0), [])
+        images = self.create_filer_images(self.user, 2, thumbnails=True)
+        self.assertTrue(images[0].thumbnails)
+        self.assertEqual(images[1].file.name, images[0].file.name)
+
     def test_create_django_image_object(self):
         image = self.create_django_image_object()
         self.assertEqual(image.name, self.image_name)
@@ -172,6 +217,25 @@ class FakeTests(BaseTestCase):
         rendered_2 = self.render_plugin(public, "en", plugin)
         self.assertEqual(rendered_2, sample_text)
 
+    def test_render_plugins(self):
+        from django.conf import settings
+
+        if "cms" not in settings.INSTALLED_APPS:
+            raise unittest.SkipTest("django CMS not available, skipping test")
+
+        from cms.api import add_plugin
+
+        sample_text = "\nfake text\nen\nPage title\n\n"
+        pages = self.get_pages()
+        public = pages[0].get_public_object()
+        placeholder = pages[0].placeholders.get(slot="content")
+        plugins = [add_plugin(placeholder=placeholder, plugin_type="FakePlugin", language="en") for _i in range(3)]
+        pages[0].publish("en")
+        rendered, timings = self.render_plugins(public, "en", plugins)
+        self.assertEqual(rendered, [sample_text] * 3)
+        self.assertEqual(len(timings), 3)
+        self.assertTrue(all(timing >= 0 for timing in timings))
+
     def test_request(self):
         from django.conf import settings
 